@@ -1,27 +1,19 @@
 import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'scripts'))
+from collect_youtube import load_videos, merge_videos, playlist_item_to_video
 
 try:
     with open('data/youtube_raw.json', 'r', encoding='utf-8') as f:
         raw = json.load(f)
-    
-    videos = []
-    if 'items' in raw:
-        for item in raw['items']:
-            snippet = item['snippet']
-            thumbnails = snippet.get('thumbnails', {})
-            thumb = thumbnails.get('medium', {}).get('url') or thumbnails.get('default', {}).get('url')
-            
-            videos.append({
-                'id': snippet['resourceId']['videoId'],
-                'title': snippet['title'],
-                'thumbnail': thumb,
-                'publishedAt': snippet['publishedAt']
-            })
-            
-    with open('data/youtube.json', 'w', encoding='utf-8') as f:
-        json.dump(videos, f, indent=2, ensure_ascii=False)
-        
-    print(f"Saved {len(videos)} videos to data/youtube.json")
+
+    # 変換は収集スクリプトと共通。既存のdata/youtube.jsonを上書きせずにマージする
+    new_videos = [video for video in map(playlist_item_to_video, raw.get('items', [])) if video]
+    videos = merge_videos(load_videos(), new_videos)
+
+    print(f"Merged {len(new_videos)} videos into data/youtube.json ({len(videos)} total)")
 
 except Exception as e:
     print(f"Error: {e}")
@@ -0,0 +1,137 @@
+"""
+school_risk_cache のキャッシュキー生成
+表記ゆれ（全角/半角・空白・「高等学校」/「高校」・「〇〇県立」と都道府県の指定の重複）を
+正規化してからハッシュし、同じ学校が同じキーになるようにする
+設置者（市立・県立・私立など）は学校を区別するので残す（市立船橋高校と県立船橋高校は別の学校）
+"""
+
+import hashlib
+import re
+import unicodedata
+
+# キー形式のバージョン（正規化ルールを変えたら上げて rehash_school_cache.py を実行）
+CACHE_KEY_VERSION = "v3"
+
+PREFECTURES = [
+    "北海道", "青森県", "岩手県", "宮城県", "秋田県", "山形県", "福島県",
+    "茨城県", "栃木県", "群馬県", "埼玉県", "千葉県", "東京都", "神奈川県",
+    "新潟県", "富山県", "石川県", "福井県", "山梨県", "長野県", "岐阜県",
+    "静岡県", "愛知県", "三重県", "滋賀県", "京都府", "大阪府", "兵庫県",
+    "奈良県", "和歌山県", "鳥取県", "島根県", "岡山県", "広島県", "山口県",
+    "徳島県", "香川県", "愛媛県", "高知県", "福岡県", "佐賀県", "長崎県",
+    "熊本県", "大分県", "宮崎県", "鹿児島県", "沖縄県"
+]
+
+NO_PREFECTURE = "指定なし"
+
+# 学校種別の同義語（左を右に寄せる）
+SCHOOL_TYPE_SYNONYMS = [
+    ("高等学校", "高校"),
+    ("付属", "附属"),
+    ("付屬", "附属"),
+]
+
+# 末尾の略称（「〇〇小」→「〇〇小学校」など）
+SCHOOL_SUFFIX_ABBREVIATIONS = [
+    (re.compile(r"小$"), "小学校"),
+    (re.compile(r"中学?$"), "中学校"),
+    (re.compile(r"高$"), "高校"),
+]
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def short_prefecture(prefecture: str) -> str:
+    """「東京都」→「東京」、「北海道」はそのまま"""
+    if prefecture == "北海道":
+        return prefecture
+    return re.sub(r"[都府県]$", "", prefecture)
+
+
+def normalize_prefecture(prefecture: str) -> str:
+    """都道府県を短縮形に正規化（指定なし・不明は空文字）"""
+    prefecture = _WHITESPACE_RE.sub("", unicodedata.normalize("NFKC", prefecture or ""))
+    if not prefecture or prefecture == NO_PREFECTURE:
+        return ""
+    for full in PREFECTURES:
+        if prefecture in (full, short_prefecture(full)):
+            return short_prefecture(full)
+    return prefecture
+
+
+def split_prefecture(name: str) -> tuple[str, str]:
+    """学校名の先頭にある都道府県を切り出す: (短縮形の都道府県, 残りの学校名)
+
+    「千葉県 〇〇高校」のように区切りが明確な場合だけ取り除く。
+    「千葉県立〇〇高校」は設置者を残して「県立〇〇高校」にする（「東京都立」→「都立」、「北海道立」→「道立」）。
+    「北海道大学」のように名前の一部である場合は、都道府県だけ推定して名前は残す。
+
+    >>> split_prefecture("千葉県立船橋高等学校")
+    ('千葉', '県立船橋高等学校')
+    >>> split_prefecture("静岡県立大学")
+    ('静岡', '県立大学')
+    >>> split_prefecture("北海道大学")
+    ('北海道', '北海道大学')
+    """
+    name = unicodedata.normalize("NFKC", name or "").strip()
+    for full in PREFECTURES:
+        short = short_prefecture(full)
+        for prefix in dict.fromkeys((full, short)):
+            if not name.startswith(prefix):
+                continue
+            rest = name[len(prefix):]
+            if prefix == full and rest.startswith("立"):
+                return short, full[-1] + rest
+            if rest[:1].isspace():
+                return short, rest
+            if prefix == full:
+                return short, name
+    return "", name
+
+
+def normalize_school_name(name: str) -> str:
+    """学校名の表記ゆれを正規化"""
+    name = unicodedata.normalize("NFKC", name or "")
+    name = _WHITESPACE_RE.sub("", name).lower()
+    for src, dst in SCHOOL_TYPE_SYNONYMS:
+        name = name.replace(src, dst)
+    for pattern, replacement in SCHOOL_SUFFIX_ABBREVIATIONS:
+        name = pattern.sub(replacement, name)
+    return name
+
+
+def canonicalize(school_name: str, prefecture: str, infer_prefecture: bool = True) -> tuple[str, str]:
+    """(正規化した学校名, 短縮形の都道府県) を返す
+
+    設置者が違えば別の学校として扱い、都道府県の重複した書き方だけをまとめる。
+
+    >>> canonicalize("千葉県立船橋高等学校", "指定なし") == canonicalize("県立船橋高校", "千葉県")
+    True
+    >>> canonicalize("市立船橋高校", "千葉県") == canonicalize("県立船橋高校", "千葉県")
+    False
+    >>> canonicalize("市立浦和高校", "埼玉県") == canonicalize("浦和高校", "埼玉県")
+    False
+    >>> canonicalize("静岡県立大学", "指定なし") == canonicalize("静岡大学", "静岡県")
+    False
+    >>> canonicalize("東京都立 日比谷高校", "東京都")
+    ('都立日比谷高校', '東京')
+    """
+    prefecture = normalize_prefecture(prefecture)
+    inferred, rest = split_prefecture(school_name)
+    if inferred and (not prefecture or prefecture == inferred):
+        if infer_prefecture or prefecture:
+            school_name = rest
+            prefecture = inferred
+    return normalize_school_name(school_name), prefecture
+
+
+def generate_cache_key(school_name: str, prefecture: str, infer_prefecture: bool = True) -> str:
+    name, pref = canonicalize(school_name, prefecture, infer_prefecture)
+    raw = f"{CACHE_KEY_VERSION}|{name}|{pref}"
+    return hashlib.md5(raw.encode()).hexdigest()
+
+
+def legacy_cache_key(school_name: str, prefecture: str) -> str:
+    """v1（正規化なし）のキー。移行ツールで旧行を特定するために使う"""
+    raw = f"{school_name}_{prefecture}".lower().strip()
+    return hashlib.md5(raw.encode()).hexdigest()
@@ -0,0 +1,92 @@
+"""
+子ども事件データ(child-cases.json)の文字bigram転置インデックス
+title / summary / location を対象に、キーワードを含む事件を全件走査せずに探す
+所在地は収集時に付けた prefecture_code / city_code（scripts/gazetteer.py）で引く
+"""
+
+import re
+import unicodedata
+from collections import defaultdict
+
+# フィールドごとの重み（タイトル一致を最も重視）
+FIELD_WEIGHTS = {"title": 3, "location": 2, "summary": 1}
+# 所在地コードが一致したときの加点（市区町村の方が具体的）
+CITY_MATCH_SCORE = 4
+PREFECTURE_MATCH_SCORE = 2
+
+_TAG_RE = re.compile(r"<[^>]+>")
+
+
+def normalize_text(text: str) -> str:
+    """NFKC正規化・小文字化・HTMLタグ除去"""
+    text = _TAG_RE.sub(" ", text or "")
+    return unicodedata.normalize("NFKC", text).lower()
+
+
+def bigrams(text: str) -> set:
+    return {text[i:i + 2] for i in range(len(text) - 1)}
+
+
+class CaseIndex:
+    """bigram -> 事件番号の転置インデックス"""
+
+    def __init__(self, cases: list):
+        self.cases = cases
+        self._texts = []  # 事件ごとの {フィールド: 正規化済みテキスト}
+        self._postings = defaultdict(set)
+        self._by_prefecture = defaultdict(set)
+        self._by_city = defaultdict(set)
+        for i, case in enumerate(cases):
+            if case.get("prefecture_code"):
+                self._by_prefecture[case["prefecture_code"]].add(i)
+            if case.get("city_code"):
+                self._by_city[case["city_code"]].add(i)
+            texts = {field: normalize_text(str(case.get(field, "") or "")) for field in FIELD_WEIGHTS}
+            self._texts.append(texts)
+            for text in texts.values():
+                for gram in bigrams(text):
+                    self._postings[gram].add(i)
+
+    def __len__(self):
+        return len(self.cases)
+
+    def candidates(self, keyword: str) -> set:
+        """keywordの全bigramを含む事件番号（最小のpostingから積集合をとる）"""
+        grams = sorted(bigrams(keyword), key=lambda g: len(self._postings.get(g, ())))
+        if not grams:
+            return set()
+        result = set(self._postings.get(grams[0], ()))
+        for gram in grams[1:]:
+            if not result:
+                break
+            result &= self._postings.get(gram, set())
+        return result
+
+    def search(self, keywords: list, limit: int = 5, prefecture_code: str = "", city_code: str = "") -> list:
+        """キーワードの一致強度（フィールド重み×キーワード重み）＋所在地コードの一致と、日付の新しさ順で返す
+
+        keywordsは重要度の高い順に並べる（先頭ほど重みが大きい）。
+        2文字未満のキーワードは無視する。
+        """
+        keywords = [normalize_text(k).strip() for k in keywords]
+        keywords = [k for k in dict.fromkeys(keywords) if len(k) >= 2]
+        scores = defaultdict(int)
+        for rank, keyword in enumerate(keywords):
+            keyword_weight = len(keywords) - rank
+            for i in self.candidates(keyword):
+                texts = self._texts[i]
+                # bigramの一致だけでは連続一致とは限らないので最終確認
+                for field, weight in FIELD_WEIGHTS.items():
+                    if keyword in texts[field]:
+                        scores[i] += weight * keyword_weight
+        for i in self._by_city.get(city_code, ()) if city_code else ():
+            scores[i] += CITY_MATCH_SCORE
+        for i in self._by_prefecture.get(prefecture_code, ()) if prefecture_code else ():
+            scores[i] += PREFECTURE_MATCH_SCORE
+
+        ranked = sorted(
+            scores,
+            key=lambda i: (scores[i], str(self.cases[i].get("date", "")), i),
+            reverse=True,
+        )
+        return [self.cases[i] for i in ranked[:limit]]
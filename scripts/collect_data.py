@@ -5,10 +5,19 @@ Gemini APIを使用した判例・事件データ自動収集スクリプト
 """
 
 import os
-import json
-import re
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 import google.generativeai as genai
+import gemini_models
+import record_schema
+from json_stream import JsonArrayStream, iter_array_elements
+from gazetteer import annotate
+from jsonl_store import JsonlStore
+from near_dup import update_index
+from publish_shards import publish_shards
+from publish_stats import publish_stats
 
 # Gemini API設定
 GEMINI_API_KEY = os.environ.get('GEMINI_API_KEY')
@@ -17,12 +26,6 @@ if not GEMINI_API_KEY:
 
 genai.configure(api_key=GEMINI_API_KEY)
 
-# 利用可能なモデルを確認
-print("📋 利用可能なモデル:")
-for m in genai.list_models():
-    if 'generateContent' in m.supported_generation_methods:
-        print(f"  - {m.name}")
-
 # モデル設定
 model = genai.GenerativeModel('models/gemini-2.0-flash')
 
@@ -31,37 +34,52 @@ DATA_DIR = 'data'
 JUDGMENTS_FILE = os.path.join(DATA_DIR, 'judgments.json')
 CHILD_CASES_FILE = os.path.join(DATA_DIR, 'child-cases.json')
 
-def load_existing_data(filepath):
-    """既存のJSONデータを読み込む"""
-    if os.path.exists(filepath):
-        with open(filepath, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    return []
-
-def save_data(filepath, data):
-    """JSONデータを保存"""
-    with open(filepath, 'w', encoding='utf-8') as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
-    print(f"✅ Saved {len(data)} items to {filepath}")
-
-def extract_json_from_response(text):
-    """レスポンスからJSON配列を抽出"""
-    # コードブロック内のJSONを探す
-    json_match = re.search(r'```(?:json)?\s*(\[[\s\S]*?\])\s*```', text)
-    if json_match:
-        return json_match.group(1)
-    # コードブロックなしでJSON配列を探す
-    json_match = re.search(r'\[[\s\S]*\]', text)
-    if json_match:
-        return json_match.group(0)
-    return None
+# バッチモード（--batch）: カテゴリごとのプロンプトを並列に実行する
+JUDGMENT_CATEGORIES = ["親権", "監護者指定", "子の引き渡し", "面会交流", "連れ去り"]
+ITEMS_PER_CATEGORY = 3
+BATCH_MAX_WORKERS = 3      # 同時リクエスト数の上限（レート制限対策）
+BATCH_MAX_ATTEMPTS = 3     # 失敗したカテゴリだけを再実行する回数の上限
+BATCH_RETRY_BACKOFF = 5    # 再実行前の待ち時間（秒、回数に応じて倍々に増やす）
+
+def load_existing_index(filepath):
+    """既存データのURL集合と最大IDをストリームで読み込む"""
+    existing_urls = set()
+    max_id = 0
+    for item in JsonlStore(filepath).iter_records():
+        existing_urls.add(item.get('url', ''))
+        max_id = max(max_id, item.get('id', 0))
+    return existing_urls, max_id
+
+def save_data(filepath, new_items):
+    """新しいレコードをジャーナルに追記し、公開JSONを書き出す"""
+    store = JsonlStore(filepath)
+    store.append(new_items)
+    total = store.compact()
+    print(f"✅ Saved {total} items to {filepath}")
+    if filepath == CHILD_CASES_FILE:
+        publish_shards(filepath)
+        # RSS収集の近似重複判定でも、ここで追加した事件を見つけられるようにする
+        update_index(filepath, new_items)
+    publish_stats(filepath)
+
+def stream_json_elements(prompt, **kwargs):
+    """応答をストリームで受け取り、JSON配列の要素が完成するたびに返す
+
+    壊れた要素や途中で切れた末尾は警告して飛ばし、それまでに得た要素は生かす。
+    """
+    stream = JsonArrayStream()
+    response = model.generate_content(prompt, stream=True, **kwargs)
+    yield from iter_array_elements((chunk.text for chunk in response), stream)
+    if not stream.started:
+        print("⚠️ JSONが見つかりませんでした")
+    for error in stream.errors:
+        print(f"⚠️ {error}")
 
 def collect_judgments():
     """判例データを収集"""
     print("📚 判例データを収集中...")
     
-    existing = load_existing_data(JUDGMENTS_FILE)
-    existing_urls = {item.get('url', '') for item in existing}
+    existing_urls, max_id = load_existing_index(JUDGMENTS_FILE)
     
     prompt = """日本の家庭裁判所の最新の判決・事例を5件収集してください。
 
@@ -89,43 +107,127 @@ def collect_judgments():
 【タグの例】
 親権, 監護者指定, 面会交流, 子の引き渡し, 連れ去り, 父親, 母親, 認容, 却下, 和解, 調停, 審判, 訴訟, DV, モラハラ, 乳幼児, 小学生以上"""
 
+    # 重複チェック（要素が届くたびに処理）
+    added_items = []
+    
     try:
-        response = model.generate_content(prompt)
-        json_str = extract_json_from_response(response.text)
-        
-        if not json_str:
-            print("⚠️ JSONが見つかりませんでした")
-            return
-        
-        new_items = json.loads(json_str)
-        
-        # 重複チェック
-        added_count = 0
-        max_id = max([item.get('id', 0) for item in existing], default=0)
-        
-        for item in new_items:
+        for item in stream_json_elements(prompt):
+            if not isinstance(item, dict):
+                continue
             if item.get('url') not in existing_urls:
                 max_id += 1
                 item['id'] = max_id
                 item['collected_at'] = datetime.now().isoformat()
-                existing.append(item)
-                added_count += 1
-        
-        if added_count > 0:
-            save_data(JUDGMENTS_FILE, existing)
-            print(f"✅ {added_count}件の新しい判例を追加しました")
-        else:
-            print("ℹ️ 新しい判例はありませんでした")
-            
+                added_items.append(item)
+                existing_urls.add(item.get('url'))
     except Exception as e:
+        # 途中で失敗しても、それまでに届いた要素は保存する
         print(f"❌ 判例収集エラー: {e}")
+    
+    added_count = len(added_items)
+    if added_count > 0:
+        save_data(JUDGMENTS_FILE, added_items)
+        print(f"✅ {added_count}件の新しい判例を追加しました")
+    else:
+        print("ℹ️ 新しい判例はありませんでした")
+
+def build_judgment_batch_prompt(category):
+    """カテゴリ別の判例収集プロンプト（出力形式はresponse_schemaで指定する）"""
+    return f"""日本の家庭裁判所の最新の判決・事例のうち「{category}」に関するものを{ITEMS_PER_CATEGORY}件収集してください。
+
+【収集条件】
+- 期間: 2023年〜現在
+- 実在する判例・事例のみ（法律事務所の解決事例も可）
+- dateはYYYY-MM-DD形式、urlは実際に閲覧できるURL
+- titleは30文字程度、summaryは100文字程度
+- tagsには「{category}」を含め、父親/母親、認容/却下/和解、調停/審判/訴訟、DV、モラハラ、乳幼児/小学生以上などから該当するものを付ける"""
+
+def request_category(category, fields):
+    """1カテゴリ分を生成し、検証を通った要素のリストを返す（1件も得られなければ例外）"""
+    items = stream_json_elements(
+        build_judgment_batch_prompt(category),
+        generation_config={
+            "response_mime_type": "application/json",
+            "response_schema": record_schema.response_schema(fields),
+        },
+    )
+
+    valid = []
+    for item in items:
+        record, errors = record_schema.validate(item, fields)
+        if record is None:
+            print(f"  ⚠️ [{category}] 不正な要素を除外: {'; '.join(errors)}")
+            continue
+        if category not in record['tags']:
+            record['tags'].insert(0, category)
+        valid.append(record)
+    if not valid:
+        raise ValueError("有効な要素がありません")
+    return valid
+
+def run_batch(categories, fields):
+    """カテゴリごとのリクエストを並列実行し、失敗したカテゴリだけを再実行する
+
+    戻り値: (カテゴリ -> 要素リスト, 最後まで失敗したカテゴリ -> エラー)
+    """
+    results = {}
+    failures = {}
+    pending = list(categories)
+    for attempt in range(1, BATCH_MAX_ATTEMPTS + 1):
+        if attempt > 1:
+            wait = BATCH_RETRY_BACKOFF * 2 ** (attempt - 2)
+            print(f"🔁 {len(pending)}カテゴリを再実行します（{attempt}回目、{wait}秒後）")
+            time.sleep(wait)
+
+        with ThreadPoolExecutor(max_workers=min(BATCH_MAX_WORKERS, len(pending))) as executor:
+            futures = {category: executor.submit(request_category, category, fields) for category in pending}
+
+        failures = {}
+        for category, future in futures.items():
+            try:
+                results[category] = future.result()
+                print(f"  ✅ [{category}] {len(results[category])}件")
+            except Exception as e:
+                failures[category] = e
+                print(f"  ⚠️ [{category}] 失敗: {e}")
+
+        pending = [category for category in categories if category in failures]
+        if not pending:
+            break
+    return results, failures
+
+def collect_judgments_batch():
+    """判例データをカテゴリ別に並列収集（スキーマ指定のJSON出力）"""
+    print(f"📚 判例データをバッチ収集中（{len(JUDGMENT_CATEGORIES)}カテゴリ、同時{BATCH_MAX_WORKERS}件まで）...")
+    
+    existing_urls, max_id = load_existing_index(JUDGMENTS_FILE)
+    results, failures = run_batch(JUDGMENT_CATEGORIES, record_schema.JUDGMENT_FIELDS)
+    
+    # 重複チェック（カテゴリ間で同じ判例が返ることもある）
+    added_items = []
+    for category in JUDGMENT_CATEGORIES:
+        for item in results.get(category, []):
+            if item['url'] not in existing_urls:
+                max_id += 1
+                item['id'] = max_id
+                item['collected_at'] = datetime.now().isoformat()
+                added_items.append(item)
+                existing_urls.add(item['url'])
+    
+    if added_items:
+        save_data(JUDGMENTS_FILE, added_items)
+        print(f"✅ {len(added_items)}件の新しい判例を追加しました")
+    else:
+        print("ℹ️ 新しい判例はありませんでした")
+    
+    for category, error in failures.items():
+        print(f"❌ [{category}] {BATCH_MAX_ATTEMPTS}回試行しても取得できませんでした: {error}")
 
 def collect_child_cases():
     """子供関連事件データを収集"""
     print("👶 子供関連事件データを収集中...")
     
-    existing = load_existing_data(CHILD_CASES_FILE)
-    existing_urls = {item.get('url', '') for item in existing}
+    existing_urls, max_id = load_existing_index(CHILD_CASES_FILE)
     
     prompt = """日本で最近報道された子供に関する事件・事例を10件収集してください。
 
@@ -161,38 +263,43 @@ def collect_child_cases():
 - 結果: 逮捕, 書類送検, 起訴, 保護, 死亡, 重傷
 - 機関: 児童相談所, 警察, 学校, 病院, 近隣通報"""
 
+    # 重複チェック（要素が届くたびに処理）
+    added_items = []
+    
     try:
-        response = model.generate_content(prompt)
-        json_str = extract_json_from_response(response.text)
-        
-        if not json_str:
-            print("⚠️ JSONが見つかりませんでした")
-            return
-        
-        new_items = json.loads(json_str)
-        
-        # 重複チェック
-        added_count = 0
-        max_id = max([item.get('id', 0) for item in existing], default=0)
-        
-        for item in new_items:
-            if item.get('url') not in existing_urls:
+        for element in stream_json_elements(prompt):
+            item, errors = record_schema.validate(element, record_schema.CHILD_CASE_FIELDS)
+            if item is None:
+                print(f"  ⚠️ 不正な要素を除外: {'; '.join(errors)}")
+                continue
+            if item['url'] not in existing_urls:
                 max_id += 1
                 item['id'] = max_id
                 item['collected_at'] = datetime.now().isoformat()
-                existing.append(item)
-                added_count += 1
-        
-        if added_count > 0:
-            save_data(CHILD_CASES_FILE, existing)
-            print(f"✅ {added_count}件の新しい事件を追加しました")
-        else:
-            print("ℹ️ 新しい事件はありませんでした")
-            
+                added_items.append(annotate(item))
+                existing_urls.add(item['url'])
     except Exception as e:
+        # 途中で失敗しても、それまでに届いた要素は保存する
         print(f"❌ 事件収集エラー: {e}")
+    
+    added_count = len(added_items)
+    if added_count > 0:
+        save_data(CHILD_CASES_FILE, added_items)
+        print(f"✅ {added_count}件の新しい事件を追加しました")
+    else:
+        print("ℹ️ 新しい事件はありませんでした")
+
+def print_available_models():
+    """利用可能なモデルを表示（--list-models 指定時のみ。API呼び出しが発生する）"""
+    print("📋 利用可能なモデル:")
+    for name in gemini_models.list_generate_models():
+        print(f"  - {name}")
 
 def main():
+    if "--list-models" in sys.argv[1:]:
+        print_available_models()
+        return
+    
     print("=" * 50)
     print(f"🤖 データ収集開始: {datetime.now().isoformat()}")
     print("=" * 50)
@@ -200,8 +307,11 @@ def main():
     # データディレクトリ確認
     os.makedirs(DATA_DIR, exist_ok=True)
     
-    # 判例データ収集
-    collect_judgments()
+    # 判例データ収集（--batch でカテゴリ別の並列収集）
+    if "--batch" in sys.argv[1:]:
+        collect_judgments_batch()
+    else:
+        collect_judgments()
     
     # 子供関連事件データ収集は停止（URLの信頼性問題のため）
     # collect_child_cases()
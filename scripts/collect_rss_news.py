@@ -6,13 +6,32 @@ RSSフィードから子供関連事件ニュースを収集するスクリプ
 
 import os
 import json
+import time
 import feedparser
+import http_client
+from gazetteer import annotate
+from jsonl_store import JsonlStore
+from near_dup import NearDupIndex, index_path
+from publish_shards import publish_shards
+from publish_stats import publish_stats
+from record_normalize import normalize_record, normalize_text
+from url_resolver import UrlResolver
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from urllib.parse import urlparse
 
 # データファイルパス
 DATA_DIR = 'data'
 CHILD_CASES_FILE = os.path.join(DATA_DIR, 'child-cases.json')
+# 近似重複検出用のSimHashインデックス（実行をまたいで保持）
+DEDUP_INDEX_FILE = index_path(CHILD_CASES_FILE)  # collect_data.py も同じインデックスを更新する
+# フィードごとのETag/Last-Modified（次回の条件付きGETに使う）
+FEED_STATE_FILE = os.path.join(DATA_DIR, 'rss-feed-state.json')
+
+# 並列取得の設定
+MAX_FEED_WORKERS = 4
+FEED_TIMEOUT = 15  # フィードごとのタイムアウト（秒）
 
 # RSSフィード一覧（直接URLを提供するニュースソースのみ）
 RSS_FEEDS = [
@@ -33,63 +52,129 @@ MAIN_KEYWORDS = ["虐待", "ネグレクト", "児童", "子ども", "子供", "
 # サブキーワード（事件性を示す）
 SUB_KEYWORDS = ["傷害", "逮捕", "死亡", "暴行", "事件", "容疑", "送検", "起訴", "殺害", "遺体", "通報", "相談", "保護", "介入"]
 
-def load_existing_data():
-    """既存のJSONデータを読み込む"""
-    if os.path.exists(CHILD_CASES_FILE):
-        with open(CHILD_CASES_FILE, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    return []
+# 加害者タグ（照合キーワード → タグ）
+PERPETRATOR_TAGS = {"父": "実父", "父親": "実父", "母": "実母", "母親": "実母", "継父": "継父", "継母": "継母", "交際相手": "交際相手"}
 
-def save_data(data):
-    """JSONデータを保存"""
-    with open(CHILD_CASES_FILE, 'w', encoding='utf-8') as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
-    print(f"✅ Saved {len(data)} items to {CHILD_CASES_FILE}")
+# 関連度スコア（メイン1つで2点、サブ1つで1点）
+MAIN_KEYWORD_WEIGHT = 2
+SUB_KEYWORD_WEIGHT = 1
+MIN_RELEVANCE_SCORE = 2  # 3にするとメイン+サブが必要になり、フィルタが厳しくなる
 
-def is_relevant_article(title, summary=""):
-    """記事が子供関連事件に関係するかチェック"""
-    text = (title + " " + summary).lower()
+# 照合用に小文字化したキーワード（"DV" なども大文字小文字を区別せずに見つける）
+_MAIN_LOWER = [(kw, kw.lower()) for kw in MAIN_KEYWORDS]
+_SUB_LOWER = [(kw, kw.lower()) for kw in SUB_KEYWORDS]
+
+def load_existing_index(resolver):
+    """既存データのURL集合・最大ID・近似重複インデックスをストリームで読み込む
+    
+    URL集合には保存されているURLと、その解決済みURL（キャッシュにあるもの）の両方を入れる。
+    """
+    existing_urls = set()
+    max_id = 0
+    rebuild_dedup = not os.path.exists(DEDUP_INDEX_FILE)
+    dedup = NearDupIndex.load(DEDUP_INDEX_FILE)
+    for item in JsonlStore(CHILD_CASES_FILE).iter_records():
+        urls = [item.get('url', '')] + [s.get('url', '') for s in item.get('sources', [])]
+        existing_urls.update(urls)
+        existing_urls.update(resolver.lookup(url) for url in urls)
+        max_id = max(max_id, item.get('id', 0))
+        if rebuild_dedup:
+            dedup.add(item['id'], item.get('title', ''), item.get('date', ''))
+    return existing_urls, max_id, dedup
+
+def add_sources(record, extra_sources):
+    """重複記事の配信元をレコードのsourcesにまとめる"""
+    sources = record.get('sources') or [{"source": record.get('source', ''), "url": record.get('url', '')}]
+    known_urls = {s['url'] for s in sources}
+    for source in extra_sources:
+        if source['url'] not in known_urls:
+            sources.append(source)
+            known_urls.add(source['url'])
+    record['sources'] = sources
+    return record
+
+def merge_duplicates(new_items, duplicate_sources):
+    """近似重複として見つかった配信元を正規レコードに追加し、更新が必要な既存レコードを返す"""
+    new_by_id = {item['id']: item for item in new_items}
+    for record_id, sources in duplicate_sources.items():
+        if record_id in new_by_id:
+            add_sources(new_by_id[record_id], sources)
     
-    # メインキーワードが1つ以上含まれているか
-    has_main = any(kw in text for kw in MAIN_KEYWORDS)
+    existing_ids = set(duplicate_sources) - set(new_by_id)
+    updated = []
+    if existing_ids:
+        for record in JsonlStore(CHILD_CASES_FILE).iter_records():
+            if record.get('id') in existing_ids:
+                updated.append(add_sources(record, duplicate_sources[record['id']]))
+    return updated
+
+def save_data(records):
+    """新規・更新レコードをジャーナルに追記し、公開JSONを書き出す"""
+    store = JsonlStore(CHILD_CASES_FILE)
+    store.append(records)
+    total = store.compact()
+    print(f"✅ Saved {total} items to {CHILD_CASES_FILE}")
+    publish_shards(CHILD_CASES_FILE)
+    publish_stats(CHILD_CASES_FILE)
+
+def load_feed_state():
+    """前回取得時のフィードごとのETag/Last-Modifiedを読み込む"""
+    if os.path.exists(FEED_STATE_FILE):
+        with open(FEED_STATE_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    return {}
+
+def save_feed_state(state):
+    with open(FEED_STATE_FILE, 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False, indent=2, sort_keys=True)
+
+def fetch_feed(feed_info, state):
+    """フィードを条件付きGETで取得（変更なしなら304でentriesを返さない）"""
+    started = time.perf_counter()
+    result = {"status": None, "entries": [], "state": state, "error": None}
+    headers = {}
+    if state.get('etag'):
+        headers['If-None-Match'] = state['etag']
+    if state.get('modified'):
+        headers['If-Modified-Since'] = state['modified']
     
-    if not has_main:
-        return False
+    try:
+        response = http_client.get(feed_info['url'], headers=headers, timeout=FEED_TIMEOUT)
+        result["status"] = response.status_code
+        if response.status_code != 304:
+            response.raise_for_status()
+            result["entries"] = feedparser.parse(response.content).entries
+            result["state"] = {
+                "etag": response.headers.get('ETag'),
+                "modified": response.headers.get('Last-Modified'),
+            }
+    except Exception as e:
+        result["error"] = str(e)
     
-    # サブキーワードも含まれていればより確実
-    has_sub = any(kw in text for kw in SUB_KEYWORDS)
+    result["elapsed"] = time.perf_counter() - started
+    return result
+
+def classify_article(title, summary=""):
+    """関連度スコアとタグをまとめて求める: (score, tags)
     
-    # メインキーワードだけでもOK、サブがあればボーナス
-    return True
+    メインキーワードを1つも含まない記事のスコアは0。
+    """
+    text = (title + " " + summary).lower()
+    main = {kw for kw, lower in _MAIN_LOWER if lower in text}
+    sub = {kw for kw, lower in _SUB_LOWER if lower in text}
+    score = MAIN_KEYWORD_WEIGHT * len(main) + SUB_KEYWORD_WEIGHT * len(sub) if main else 0
+    tags = main | sub | {tag for kw, tag in PERPETRATOR_TAGS.items() if kw in text}
+    return score, sorted(tags)
+
+def is_relevant_article(title, summary=""):
+    """記事が子供関連事件に関係するかチェック"""
+    score, _ = classify_article(title, summary)
+    return score >= MIN_RELEVANCE_SCORE
 
 def extract_tags(title, summary=""):
     """タイトルと概要からタグを抽出"""
-    text = title + " " + summary
-    tags = []
-    
-    # メインキーワードからタグ抽出
-    for kw in MAIN_KEYWORDS:
-        if kw in text:
-            tags.append(kw)
-    
-    # サブキーワードからタグ抽出
-    for kw in SUB_KEYWORDS:
-        if kw in text:
-            tags.append(kw)
-    
-    # 加害者タグ
-    if "父" in text or "父親" in text:
-        tags.append("実父")
-    if "母" in text or "母親" in text:
-        tags.append("実母")
-    if "継父" in text:
-        tags.append("継父")
-    if "継母" in text:
-        tags.append("継母")
-    if "交際相手" in text:
-        tags.append("交際相手")
-    
-    return list(set(tags))  # 重複除去
+    _, tags = classify_article(title, summary)
+    return tags
 
 def parse_date(entry):
     """RSSエントリから日付を抽出"""
@@ -103,54 +188,103 @@ def collect_from_rss():
     """RSSフィードから記事を収集"""
     print("📡 RSSフィードから子供関連事件を収集中...")
     
-    existing = load_existing_data()
-    existing_urls = {item.get('url', '') for item in existing}
+    resolver = UrlResolver()
+    existing_urls, max_id, dedup = load_existing_index(resolver)
+    duplicate_sources = defaultdict(list)
+    
+    feed_state = load_feed_state()
     
     new_items = []
-    max_id = max([item.get('id', 0) for item in existing], default=0)
     
-    for feed_info in RSS_FEEDS:
-        try:
-            print(f"  🔍 {feed_info['source']}...")
-            feed = feedparser.parse(feed_info['url'])
+    # 取得は並列、登録はRSS_FEEDSの順（IDの採番順を安定させる）
+    with ThreadPoolExecutor(max_workers=MAX_FEED_WORKERS) as executor:
+        results = list(executor.map(
+            lambda feed_info: fetch_feed(feed_info, feed_state.get(feed_info['url'], {})),
+            RSS_FEEDS,
+        ))
+    
+    # HTMLを除いて正規化し、関連記事だけを残す（タグも同じ走査で求める）
+    candidates = []
+    for feed_info, result in zip(RSS_FEEDS, results):
+        relevant = []
+        for entry in result["entries"]:
+            title = normalize_text(entry.get('title', ''), 'title')
+            summary = normalize_text(entry.get('summary', entry.get('description', '')), 'summary')
+            score, tags = classify_article(title, summary)
+            if score >= MIN_RELEVANCE_SCORE:
+                relevant.append((entry, title, summary, tags))
+        candidates.append(relevant)
+    
+    # リダイレクト用URLを転送先の正規URLに解決（解決済みのものはキャッシュから）
+    links = [entry.get('link', '') for relevant in candidates for entry, _, _, _ in relevant]
+    resolved = resolver.resolve_many(link for link in links if link not in existing_urls)
+    if resolver.resolved_count or resolver.unresolved_count or resolver.failed_count:
+        print(f"  🔗 URL解決: {resolver.resolved_count}件 / 転送なし {resolver.unresolved_count}件 / 失敗 {resolver.failed_count}件")
+    
+    summary_rows = []
+    for feed_info, result, relevant in zip(RSS_FEEDS, results, candidates):
+        added = 0
+        merged = 0
+        for entry, title, summary, tags in relevant:
+            link = entry.get('link', '')
+            url = resolved.get(link, link)
+            
+            # 既存URLはスキップ（正規化・解決後のURLで比較）
+            if link in existing_urls or url in existing_urls:
+                continue
+            
+            # 別URLで届いた同じ記事は既存レコードの配信元としてまとめる
+            date = parse_date(entry)
+            duplicate_of = dedup.find(title, date)
+            if duplicate_of is not None:
+                duplicate_sources[duplicate_of].append({"source": feed_info['source'], "url": url})
+                existing_urls.update((link, url))
+                merged += 1
+                continue
             
-            for entry in feed.entries:
-                title = entry.get('title', '')
-                summary = entry.get('summary', entry.get('description', ''))
-                url = entry.get('link', '')
-                
-                # 既存URLはスキップ
-                if url in existing_urls:
-                    continue
-                
-                # 関連記事かチェック
-                if not is_relevant_article(title, summary):
-                    continue
-                
-                max_id += 1
-                new_item = {
-                    "id": max_id,
-                    "date": parse_date(entry),
-                    "title": title[:50],  # 50文字に制限
-                    "summary": summary[:150] if summary else title,  # 150文字に制限
-                    "url": url,
-                    "source": feed_info['source'],
-                    "tags": extract_tags(title, summary),
-                    "collected_at": datetime.now().isoformat()
-                }
-                new_items.append(new_item)
-                existing_urls.add(url)
-                
-        except Exception as e:
-            print(f"  ❌ {feed_info['source']}エラー: {e}")
-    
-    if new_items:
-        existing.extend(new_items)
-        save_data(existing)
-        print(f"✅ {len(new_items)}件の新しい記事を追加しました")
+            max_id += 1
+            # 所在地（都道府県・市区町村コード）は収集時に付けておく
+            new_item = annotate(normalize_record({
+                "id": max_id,
+                "date": date,
+                "title": title,
+                "summary": summary,
+                "url": url,
+                "source": feed_info['source'],
+                "tags": tags,
+                "collected_at": datetime.now().isoformat()
+            }))
+            new_items.append(new_item)
+            dedup.add(max_id, new_item['title'], date)
+            existing_urls.update((link, url))
+            added += 1
+        
+        if result["error"] is None:
+            feed_state[feed_info['url']] = result["state"]
+        summary_rows.append((feed_info, result, added, merged))
+    
+    # フィードごとの結果サマリー
+    print("  📊 フィード別結果:")
+    for feed_info, result, added, merged in summary_rows:
+        if result["error"]:
+            status = f"❌ {result['error']}"
+        elif result["status"] == 304:
+            status = "⏭️ 変更なし(304)"
+        else:
+            status = f"{len(result['entries'])}件取得 / {added}件追加 / {merged}件重複統合"
+        print(f"    {feed_info['source']:<10} {result['elapsed']:5.2f}秒  {status}")
+    
+    updated_items = merge_duplicates(new_items, duplicate_sources)
+    if new_items or updated_items:
+        save_data(new_items + updated_items)
+        dedup.save(DEDUP_INDEX_FILE)
+        print(f"✅ {len(new_items)}件の新しい記事を追加しました（既存{len(updated_items)}件に重複配信元を統合）")
     else:
         print("ℹ️ 新しい記事はありませんでした")
     
+    # データ保存後に記録する（保存前に失敗した場合は次回も取り直す）
+    save_feed_state(feed_state)
+    
     return len(new_items)
 
 def main():
@@ -160,6 +294,7 @@ def main():
     
     os.makedirs(DATA_DIR, exist_ok=True)
     collect_from_rss()
+    print(f"🔌 {http_client.format_stats()}")
     
     print("=" * 50)
     print("✅ RSS収集完了!")
@@ -1,100 +1,183 @@
 """
 YouTube Data Collection Script
-YouTube Data API v3 を使って最新動画情報を取得
+YouTube Data API v3 を使って動画情報を差分同期する
+
+- アップロード動画プレイリストを新しい順にページングし、既に保存済みのvideoIdに達したら止める
+- 新しい動画の再生時間・再生回数は videos.list でまとめて取得（1リクエスト50件）
+- data/youtube.json に新しい順でマージする（クォータ消費は新着動画の数にだけ比例する）
 """
 
 import os
 import json
-import requests
+from jsonl_store import write_atomic
+import http_client
 
 # 設定
 YOUTUBE_API_KEY = os.getenv("YOUTUBE_API_KEY")
 CHANNEL_ID = "UC_YFzkuNqO5a_3-qE1QqTrw"  # @meiyaku_knights のチャンネルID
-MAX_RESULTS = 10
+API_BASE = "https://www.googleapis.com/youtube/v3"
+PAGE_SIZE = 50          # playlistItems.list / videos.list の1回あたりの上限
+MAX_PAGES = 40          # 初回同期（保存済み動画なし）でもこれ以上はページングしない
+OUTPUT_PATH = "data/youtube.json"
+HIDDEN_TITLES = ("Private video", "Deleted video")
 
 def get_uploads_playlist_id():
     """チャンネルのアップロード動画プレイリストIDを取得"""
-    url = "https://www.googleapis.com/youtube/v3/channels"
+    url = f"{API_BASE}/channels"
     params = {
         "key": YOUTUBE_API_KEY,
         "id": CHANNEL_ID,
         "part": "contentDetails"
     }
-    
-    response = requests.get(url, params=params)
+
+    response = http_client.get(url, params=params)
     if response.status_code != 200:
         print(f"Error getting channel info: {response.status_code}")
         print(response.text)
         return None
-    
+
     data = response.json()
     if data.get("items"):
         return data["items"][0]["contentDetails"]["relatedPlaylists"]["uploads"]
     return None
 
-def get_latest_videos(playlist_id):
-    """プレイリストから最新動画を取得"""
-    url = "https://www.googleapis.com/youtube/v3/playlistItems"
-    params = {
-        "key": YOUTUBE_API_KEY,
-        "playlistId": playlist_id,
-        "part": "snippet",
-        "maxResults": MAX_RESULTS
+def playlist_item_to_video(item):
+    """playlistItemsの1件をサイト用の形式に変換（非公開・削除済みはNone）"""
+    snippet = item["snippet"]
+    if snippet.get("title") in HIDDEN_TITLES:
+        return None
+    thumbnails = snippet.get("thumbnails", {})
+    thumb = thumbnails.get("medium", {}).get("url") or thumbnails.get("default", {}).get("url")
+    return {
+        "id": snippet["resourceId"]["videoId"],
+        "title": snippet["title"],
+        "thumbnail": thumb,
+        "publishedAt": snippet["publishedAt"]
     }
-    
-    response = requests.get(url, params=params)
-    if response.status_code != 200:
-        print(f"Error getting videos: {response.status_code}")
-        print(response.text)
-        return []
-    
-    data = response.json()
-    videos = []
-    
-    for item in data.get("items", []):
-        snippet = item["snippet"]
-        thumbnails = snippet.get("thumbnails", {})
-        thumb = thumbnails.get("medium", {}).get("url") or thumbnails.get("default", {}).get("url")
-        
-        if snippet.get("title") != "Private video" and snippet.get("title") != "Deleted video":
-            videos.append({
-                "id": snippet["resourceId"]["videoId"],
-                "title": snippet["title"],
-                "thumbnail": thumb,
-                "publishedAt": snippet["publishedAt"]
-            })
-    
+
+def get_new_playlist_items(playlist_id, known_ids):
+    """保存済みのvideoIdが現れるまでプレイリストを新しい順にページングする
+
+    途中でエラーになった場合はNoneを返す（一部だけ保存すると、次回その位置で止まって
+    取りこぼしが出るため）。
+    """
+    url = f"{API_BASE}/playlistItems"
+    items = []
+    page_token = None
+    for page in range(1, MAX_PAGES + 1):
+        params = {
+            "key": YOUTUBE_API_KEY,
+            "playlistId": playlist_id,
+            "part": "snippet",
+            "maxResults": PAGE_SIZE
+        }
+        if page_token:
+            params["pageToken"] = page_token
+
+        response = http_client.get(url, params=params)
+        if response.status_code != 200:
+            print(f"Error getting videos (page {page}): {response.status_code}")
+            print(response.text)
+            return None
+
+        data = response.json()
+        for item in data.get("items", []):
+            if item["snippet"]["resourceId"]["videoId"] in known_ids:
+                print(f"📄 {page}ページ目で保存済みの動画に到達")
+                return items
+            items.append(item)
+
+        page_token = data.get("nextPageToken")
+        if not page_token:
+            return items
+
+    print(f"⚠️ {MAX_PAGES}ページで打ち切りました")
+    return items
+
+def get_video_details(video_ids):
+    """videos.listで再生時間・再生回数を取得（50件ずつ）: videoId -> 詳細
+
+    応答に含まれなかった動画（削除・非公開など）は duration / viewCount を None にして返す。
+    保存後は「詳細なし」として扱い、毎回の同期で問い合わせ直さない。
+    """
+    details = {}
+    for start in range(0, len(video_ids), PAGE_SIZE):
+        batch = video_ids[start:start + PAGE_SIZE]
+        response = http_client.get(f"{API_BASE}/videos", params={
+            "key": YOUTUBE_API_KEY,
+            "id": ",".join(batch),
+            "part": "contentDetails,statistics",
+            "maxResults": PAGE_SIZE
+        })
+        if response.status_code != 200:
+            print(f"Error getting video details: {response.status_code}")
+            print(response.text)
+            continue  # 詳細は次回の同期で補完される
+
+        for item in response.json().get("items", []):
+            statistics = item.get("statistics", {})
+            details[item["id"]] = {
+                "duration": item.get("contentDetails", {}).get("duration"),
+                "viewCount": int(statistics["viewCount"]) if "viewCount" in statistics else None,
+            }
+        for video_id in batch:
+            details.setdefault(video_id, {"duration": None, "viewCount": None})
+    return details
+
+def load_videos(path=OUTPUT_PATH):
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    return []
+
+def merge_videos(existing, new_videos, path=OUTPUT_PATH):
+    """新しい動画を既存の一覧にマージして新しい順に保存（同じidは新しい内容で上書き）"""
+    by_id = {video["id"]: video for video in existing}
+    for video in new_videos:
+        by_id[video["id"]] = {**by_id.get(video["id"], {}), **video}
+    videos = sorted(by_id.values(), key=lambda v: v.get("publishedAt", ""), reverse=True)
+    write_atomic(path, lambda f: json.dump(videos, f, indent=2, ensure_ascii=False))
     return videos
 
 def main():
     if not YOUTUBE_API_KEY:
         print("Error: YOUTUBE_API_KEY environment variable not set")
         return
-    
-    print("🎬 YouTube データ収集開始...")
-    
+
+    print("🎬 YouTube データ同期開始...")
+
     # プレイリストID取得
     playlist_id = get_uploads_playlist_id()
     if not playlist_id:
         print("Error: Could not get uploads playlist ID")
         return
-    
+
     print(f"📋 プレイリストID: {playlist_id}")
-    
-    # 最新動画取得
-    videos = get_latest_videos(playlist_id)
-    print(f"📹 取得動画数: {len(videos)}")
-    
-    # 保存
-    output_path = "data/youtube.json"
-    with open(output_path, "w", encoding="utf-8") as f:
-        json.dump(videos, f, indent=2, ensure_ascii=False)
-    
-    print(f"✅ 保存完了: {output_path}")
-    
-    # 確認用に最新動画タイトルを表示
-    if videos:
+
+    existing = load_videos()
+    items = get_new_playlist_items(playlist_id, {video["id"] for video in existing})
+    if items is None:
+        print("❌ 取得に失敗したため保存しません（次回やり直します）")
+        return
+
+    new_videos = [video for video in map(playlist_item_to_video, items) if video]
+    print(f"📹 新着動画数: {len(new_videos)}（保存済み {len(existing)}件）")
+
+    # 新着と、まだ詳細を取得していない保存済み動画の詳細をまとめて取得
+    # （取得できなかった動画は duration: None で保存されるので、次回以降は対象にならない）
+    backfill_ids = [video["id"] for video in existing if "duration" not in video]
+    details = get_video_details([video["id"] for video in new_videos] + backfill_ids)
+    for video in new_videos:
+        video.update(details.get(video["id"], {}))
+    updates = new_videos + [{"id": vid, **details[vid]} for vid in backfill_ids if vid in details]
+
+    if not updates:
+        print("ℹ️ 新しい動画はありませんでした")
+    else:
+        videos = merge_videos(existing, updates)
+        print(f"✅ 保存完了: {OUTPUT_PATH}（{len(videos)}件）")
         print(f"📺 最新動画: {videos[0]['title']}")
+    print(f"🔌 {http_client.format_stats()}")
 
 if __name__ == "__main__":
     main()
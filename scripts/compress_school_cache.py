@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+school_risk_cache の旧形式の行（ai_result / search_results に全文・HTMLを保存）を
+圧縮形式（ai_result_gz / search_results_json）に移行するツール
+事前に supabase_school_risk_cache.sql の v3 の列追加を実行しておくこと。
+
+1ヒットあたりの転送バイト数（分析結果と検索結果の列のJSON）を移行前後で集計して表示する。
+
+使い方:
+  SUPABASE_URL=... SUPABASE_KEY=... python scripts/compress_school_cache.py --dry-run
+  SUPABASE_URL=... SUPABASE_KEY=... python scripts/compress_school_cache.py
+"""
+
+import json
+import os
+import sys
+
+from supabase import create_client
+
+import school_analysis
+
+TABLE = "school_risk_cache"
+PAGE_SIZE = 200
+
+
+def payload_bytes(fields: dict) -> int:
+    """PostgRESTが返すJSONでのおおよそのバイト数"""
+    return len(json.dumps(fields, ensure_ascii=False).encode("utf-8"))
+
+
+def migrate_row(row: dict) -> dict:
+    """旧形式の行を新形式の列に変換した更新内容（検索結果HTMLを解析できなければHTMLを残す）"""
+    update = {"ai_result_gz": school_analysis.compress_text(row.get("ai_result") or ""), "ai_result": None}
+    search_results = school_analysis.parse_legacy_search_results(row.get("search_results"))
+    if search_results or not row.get("search_results"):
+        update["search_results_json"] = search_results
+        update["search_results"] = None
+    return update
+
+
+def fetch_legacy_rows(client):
+    """ai_result_gz が未設定の行をid順に返す"""
+    last_id = 0
+    while True:
+        response = (client.table(TABLE)
+                    .select("id, school_name, ai_result, search_results")
+                    .is_("ai_result_gz", "null")
+                    .gt("id", last_id)
+                    .order("id")
+                    .limit(PAGE_SIZE)
+                    .execute())
+        rows = response.data or []
+        yield from rows
+        if len(rows) < PAGE_SIZE:
+            return
+        last_id = rows[-1]["id"]
+
+
+def main():
+    dry_run = "--dry-run" in sys.argv[1:]
+    url = os.environ.get("SUPABASE_URL")
+    key = os.environ.get("SUPABASE_KEY")
+    if not url or not key:
+        print("Error: SUPABASE_URL / SUPABASE_KEY environment variables not set")
+        sys.exit(1)
+
+    client = create_client(url, key)
+    count = before = after = kept_html = 0
+    for row in fetch_legacy_rows(client):
+        update = migrate_row(row)
+        count += 1
+        before += payload_bytes({"ai_result": row.get("ai_result"), "search_results": row.get("search_results")})
+        after += payload_bytes({
+            "ai_result_gz": update["ai_result_gz"],
+            "search_results_json": update.get("search_results_json"),
+            "search_results": update.get("search_results", row.get("search_results")),
+        })
+        if "search_results_json" not in update:
+            kept_html += 1
+            print(f"  ⚠️ 検索結果HTMLを解析できないためそのまま残します: {row['school_name']}")
+        if not dry_run:
+            client.table(TABLE).update(update).eq("id", row["id"]).execute()
+
+    if count:
+        print(f"📦 1ヒットあたり {before / count:,.0f} → {after / count:,.0f}バイト"
+              f"（{count}行 / 合計 {before:,} → {after:,}バイト, {after / before:.0%}）")
+    print(f"📋 移行対象: {count}行（HTMLのまま {kept_html}行）")
+    print("ℹ️ --dry-run のため変更していません" if dry_run else "✅ 移行完了")
+
+
+if __name__ == "__main__":
+    main()
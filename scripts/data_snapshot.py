@@ -0,0 +1,115 @@
+"""
+公開JSONデータの条件付き取得 + ローカルスナップショット
+ETag / Last-Modified で再検証し、変更がなければ304で済ませる。
+取得できない場合は前回のスナップショット、それもなければ同梱データを使う。
+"""
+
+import json
+import os
+import time
+from datetime import datetime, timezone
+
+import http_client
+
+SNAPSHOT_DIR = os.environ.get(
+    "MEIYAKU_SNAPSHOT_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "meiyaku-knights", "snapshots"),
+)
+
+
+def _write_atomic(path: str, data: bytes):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def _read_json(path: str, default=None):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+
+def _collected_at(data):
+    """同梱データ自体の新しさ: レコードのcollected_atの最大値(epoch秒)。分からなければNone
+
+    ファイルの更新時刻はチェックアウト・デプロイした時刻なので使わない。
+    collected_atはタイムゾーンなしで保存されている（収集はGitHub ActionsのUTC）のでUTCとみなす。
+    """
+    latest = None
+    for record in data if isinstance(data, list) else ():
+        try:
+            collected = datetime.fromisoformat(str(record.get("collected_at")))
+        except (AttributeError, ValueError):
+            continue
+        if collected.tzinfo is None:
+            collected = collected.replace(tzinfo=timezone.utc)
+        latest = max(latest or collected, collected)
+    return latest.timestamp() if latest else None
+
+
+def load_json(url: str, name: str, fallback_path: str = None, timeout: float = 10) -> tuple:
+    """urlのJSONを取得して (データ, メタ情報) を返す
+
+    メタ情報: {"source": "network" | "not_modified" | "snapshot" | "bundled" | "none",
+               "fetched_at": データを最後に確認できた時刻(epoch秒) or None}
+    同梱データ（bundled）の fetched_at は、データ中で最も新しい collected_at（なければNone = 不明）。
+    """
+    snapshot_path = os.path.join(SNAPSHOT_DIR, f"{name}.json")
+    meta_path = os.path.join(SNAPSHOT_DIR, f"{name}.meta.json")
+    meta = _read_json(meta_path, {}) if os.path.exists(snapshot_path) else {}
+
+    headers = {}
+    if meta.get("etag"):
+        headers["If-None-Match"] = meta["etag"]
+    if meta.get("last_modified"):
+        headers["If-Modified-Since"] = meta["last_modified"]
+
+    try:
+        response = http_client.get(url, headers=headers, timeout=timeout)
+        if response.status_code == 304 and meta:
+            data = _read_json(snapshot_path)
+            if data is not None:
+                meta["fetched_at"] = time.time()
+                _write_atomic(meta_path, json.dumps(meta).encode())
+                return data, {"source": "not_modified", "fetched_at": meta["fetched_at"]}
+        elif response.status_code == 200:
+            data = response.json()
+            meta = {
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+                "fetched_at": time.time(),
+            }
+            _write_atomic(snapshot_path, response.content)
+            _write_atomic(meta_path, json.dumps(meta).encode())
+            return data, {"source": "network", "fetched_at": meta["fetched_at"]}
+    except Exception as e:
+        print(f"⚠️ {url} の取得に失敗: {e}")
+
+    data = _read_json(snapshot_path)
+    if data is not None:
+        return data, {"source": "snapshot", "fetched_at": meta.get("fetched_at")}
+
+    if fallback_path:
+        data = _read_json(fallback_path)
+        if data is not None:
+            return data, {"source": "bundled", "fetched_at": _collected_at(data)}
+
+    return [], {"source": "none", "fetched_at": None}
+
+
+def describe_age(fetched_at: float, now: float = None) -> str:
+    """「3時間前」のような経過時間表記"""
+    if fetched_at is None:
+        return "不明"
+    seconds = max((now or time.time()) - fetched_at, 0)
+    if seconds < 60:
+        return "たった今"
+    if seconds < 3600:
+        return f"{int(seconds // 60)}分前"
+    if seconds < 86400:
+        return f"{int(seconds // 3600)}時間前"
+    return f"{int(seconds // 86400)}日前"
@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+地名辞書（都道府県・主な市区）による所在地の判定
+収集時にタイトル・概要から地名を探し、レコードに都道府県コードと市区町村コードを付ける。
+検索時は本文を走査せず、このコードで引く。
+
+- 都道府県コード: JIS X 0401 の2桁（北海道 = 01 ... 沖縄県 = 47）
+- 市区町村コード: JIS X 0402 の5桁（検査数字なし。例: 札幌市 = 01100）
+- 収録は47都道府県と、政令指定都市・県庁所在地・東京23区・主な市のみ（全市区町村ではない）
+- 都道府県は「大阪府」のような正式名のほか、「【愛媛】」「/三重」「大阪・西成区」「長野駅」のように
+  区切りに囲まれた「県」などのない形も拾う（「テレビ静岡」「福岡大学」「山口さん」のような語の一部は拾わない）
+- 地名は辞書から作ったトライ木で、本文を左から1回だけ走査して最長一致で取り出す
+
+使い方（保存済みデータへの一括付与）:
+  python scripts/gazetteer.py data/child-cases.json
+  python -m doctest scripts/gazetteer.py   # 判定例の確認
+"""
+
+import os
+import re
+import sys
+import unicodedata
+
+from cache_keys import PREFECTURES, short_prefecture
+
+# (市区名, 市区町村コード)。都道府県コードは市区町村コードの先頭2桁
+MUNICIPALITIES = [
+    # 政令指定都市
+    ("札幌市", "01100"), ("仙台市", "04100"), ("さいたま市", "11100"), ("千葉市", "12100"),
+    ("横浜市", "14100"), ("川崎市", "14130"), ("相模原市", "14150"), ("新潟市", "15100"),
+    ("静岡市", "22100"), ("浜松市", "22130"), ("名古屋市", "23100"), ("京都市", "26100"),
+    ("大阪市", "27100"), ("堺市", "27140"), ("神戸市", "28100"), ("岡山市", "33100"),
+    ("広島市", "34100"), ("北九州市", "40100"), ("福岡市", "40130"), ("熊本市", "43100"),
+    # 県庁所在地（政令指定都市以外）
+    ("青森市", "02201"), ("盛岡市", "03201"), ("秋田市", "05201"), ("山形市", "06201"),
+    ("福島市", "07201"), ("水戸市", "08201"), ("宇都宮市", "09201"), ("前橋市", "10201"),
+    ("富山市", "16201"), ("金沢市", "17201"), ("福井市", "18201"), ("甲府市", "19201"),
+    ("長野市", "20201"), ("岐阜市", "21201"), ("津市", "24201"), ("大津市", "25201"),
+    ("奈良市", "29201"), ("和歌山市", "30201"), ("鳥取市", "31201"), ("松江市", "32201"),
+    ("山口市", "35203"), ("徳島市", "36201"), ("高松市", "37201"), ("松山市", "38201"),
+    ("高知市", "39201"), ("佐賀市", "41201"), ("長崎市", "42201"), ("大分市", "44201"),
+    ("宮崎市", "45201"), ("鹿児島市", "46201"), ("那覇市", "47201"),
+    # 東京23区
+    ("千代田区", "13101"), ("中央区", "13102"), ("港区", "13103"), ("新宿区", "13104"),
+    ("文京区", "13105"), ("台東区", "13106"), ("墨田区", "13107"), ("江東区", "13108"),
+    ("品川区", "13109"), ("目黒区", "13110"), ("大田区", "13111"), ("世田谷区", "13112"),
+    ("渋谷区", "13113"), ("中野区", "13114"), ("杉並区", "13115"), ("豊島区", "13116"),
+    ("北区", "13117"), ("荒川区", "13118"), ("板橋区", "13119"), ("練馬区", "13120"),
+    ("足立区", "13121"), ("葛飾区", "13122"), ("江戸川区", "13123"),
+    # 主な市
+    ("函館市", "01202"), ("小樽市", "01203"), ("旭川市", "01204"), ("室蘭市", "01205"),
+    ("釧路市", "01206"), ("帯広市", "01207"), ("弘前市", "02202"), ("八戸市", "02203"),
+    ("会津若松市", "07202"), ("郡山市", "07203"), ("いわき市", "07204"), ("日立市", "08202"),
+    ("つくば市", "08220"), ("高崎市", "10202"), ("川越市", "11201"), ("川口市", "11203"),
+    ("市川市", "12203"), ("船橋市", "12204"), ("柏市", "12217"), ("八王子市", "13201"),
+    ("立川市", "13202"), ("武蔵野市", "13203"), ("三鷹市", "13204"), ("府中市", "13206"),
+    ("調布市", "13208"), ("町田市", "13209"), ("横須賀市", "14201"), ("平塚市", "14203"),
+    ("鎌倉市", "14204"), ("藤沢市", "14205"), ("長岡市", "15202"), ("松本市", "20202"),
+    ("沼津市", "22203"), ("豊橋市", "23201"), ("岡崎市", "23202"), ("一宮市", "23203"),
+    ("豊田市", "23211"), ("岸和田市", "27202"), ("豊中市", "27203"), ("吹田市", "27205"),
+    ("高槻市", "27207"), ("枚方市", "27210"), ("東大阪市", "27227"), ("姫路市", "28201"),
+    ("尼崎市", "28202"), ("明石市", "28203"), ("西宮市", "28204"), ("倉敷市", "33202"),
+    ("呉市", "34202"), ("福山市", "34207"), ("大牟田市", "40202"), ("久留米市", "40203"),
+    ("沖縄市", "47211"),
+]
+
+# 他の道府県にも同名の区・市があるもの（同じ文中に都道府県名があるときだけ採用する）
+AMBIGUOUS_NAMES = {"中央区", "港区", "北区", "府中市"}
+
+# 末尾の「 - 北海道新聞デジタル」のような媒体名は所在地ではないので除く
+_PUBLISHER_SUFFIX_RE = re.compile(r"\s+[-‐－|｜]\s+[^-‐－|｜]{1,30}$")
+# 市区名の直前がこれらの文字なら、より長い地名の一部（木更津市の「津市」、東松山市の「松山市」など）とみなす
+_NAME_CHAR_RE = re.compile(r"[\u3041-\u3096\u30a1-\u30fa\u30fc\u3005\u4e00-\u9fff]")
+# 地名の直前によく来る助詞や語の終わりの字（「では松山市で」「令和7年度札幌市」など）は地名の一部ではない
+_BOUNDARY_CHARS = set("のはがをにでともへや" "年度月日時都府県道郡旧元同全各")
+# 「県」などのない都道府県名の直後に来てよい文字（「【愛媛】」「大阪・西成区」「/三重 」など）と語
+_SHORT_NAME_FOLLOWERS = set("・】》」』)/,、。 ")
+_SHORT_NAME_FOLLOWING_WORDS = ("駅",)
+_LATIN_RE = re.compile(r"[A-Za-z0-9]")
+
+
+def prefecture_name(code: str) -> str:
+    return PREFECTURES[int(code) - 1] if code and code.isdigit() and 1 <= int(code) <= len(PREFECTURES) else ''
+
+
+class Gazetteer:
+    """地名 -> (都道府県コード, 市区町村コード) のトライ木"""
+
+    def __init__(self, municipalities=MUNICIPALITIES):
+        self._root = {}
+        self._short_names = set()
+        for i, name in enumerate(PREFECTURES):
+            self._insert(name, (f"{i + 1:02d}", ''))
+            short = short_prefecture(name)
+            if short != name:
+                self._insert(short, (f"{i + 1:02d}", ''))
+                self._short_names.add(short)
+        for name, city_code in municipalities:
+            self._insert(name, (city_code[:2], city_code))
+
+    def _insert(self, name: str, place: tuple):
+        node = self._root
+        for ch in name:
+            node = node.setdefault(ch, {})
+        node[None] = (name, place)
+
+    def find_all(self, text: str) -> list:
+        """本文中の地名を左から最長一致で取り出す: [(地名, (都道府県コード, 市区町村コード)), ...]"""
+        text = unicodedata.normalize("NFKC", text or '')
+        found = []
+        found_end = -1
+        i = 0
+        while i < len(text):
+            node = self._root
+            match = None
+            j = i
+            while j < len(text) and text[j] in node:
+                node = node[text[j]]
+                j += 1
+                if None in node:
+                    match = node[None]
+            if match and match[1][1] and self._inside_longer_name(text, i, found_end):
+                match = None
+            if match and match[0] in self._short_names and not self._delimited(text, i, len(match[0]), found_end):
+                match = None
+            if match:
+                found.append(match)
+                i += len(match[0])
+                found_end = i
+            else:
+                i += 1
+        return found
+
+    @staticmethod
+    def _inside_longer_name(text: str, start: int, found_end: int) -> bool:
+        """text[start:]の市区名が、辞書にない長い地名の末尾にすぎないか
+
+        直前が別の地名の終わり（「千葉県千葉市」）や助詞なら独立した地名とみなす。
+        """
+        if start == 0 or start == found_end:
+            return False
+        prev = text[start - 1]
+        return bool(_NAME_CHAR_RE.match(prev)) and prev not in _BOUNDARY_CHARS
+
+    def _delimited(self, text: str, start: int, length: int, found_end: int) -> bool:
+        """「県」などのない都道府県名が、語の一部ではなく区切りに囲まれているか"""
+        if self._inside_longer_name(text, start, found_end) or (start > 0 and _LATIN_RE.match(text[start - 1])):
+            return False
+        end = start + length
+        return (end == len(text) or text[end] in _SHORT_NAME_FOLLOWERS or text[end].isspace()
+                or text.startswith(_SHORT_NAME_FOLLOWING_WORDS, end))
+
+    def locate(self, text: str, prefecture_code: str = '') -> tuple:
+        """本文から (都道府県コード, 市区町村コード) を推定する（不明は空文字）
+
+        prefecture_codeを指定すると、その都道府県の地名だけを採用する。
+        市区が見つかればそれを優先し、なければ最初に出てきた都道府県名を使う。
+        本文中の都道府県名と食い違う市区は採用しない。
+
+        >>> g = default_gazetteer()
+        >>> g.locate('千葉県木更津市で児童虐待 母親を逮捕')
+        ('12', '')
+        >>> g.locate('焼津市の小学校で不審者')
+        ('', '')
+        >>> g.locate('東松山市の中学校でいじめ')
+        ('', '')
+        >>> g.locate('千葉県千葉市の保育園')
+        ('12', '12100')
+        >>> g.locate('警察によると松山市の小学校で')
+        ('38', '38201')
+        >>> g.locate('令和7年度札幌市児童虐待防止対策推進本部会議')
+        ('01', '01100')
+        >>> g.locate('三重県で事故 大阪市の男性')
+        ('24', '')
+        >>> g.locate('児相や県警など合同訓練【愛媛】(あいテレビ)')
+        ('38', '')
+        >>> g.locate('児童虐待、最適な解決へ /三重 県警と児相が訓練')
+        ('24', '')
+        >>> g.locate('大阪・西成区で小学生7人はねられる')
+        ('27', '')
+        >>> g.locate('【長野駅前3人殺傷事件】保護者')
+        ('20', '')
+        >>> g.locate('子どもの虐待防止訓練(テレビ静岡NEWS)')
+        ('', '')
+        >>> g.locate('福岡大学病院は児童虐待防止に')
+        ('', '')
+        >>> g.locate('長野市立〇〇小学校')
+        ('20', '20201')
+        """
+        matches = self.find_all(text)
+        named = {pref for name, (pref, city) in matches if not city}
+        mentioned = named | ({prefecture_code} if prefecture_code else set())
+        for name, (pref, city) in matches:
+            if not city or (prefecture_code and pref != prefecture_code):
+                continue
+            if named and pref not in named:
+                continue
+            if name in AMBIGUOUS_NAMES and pref not in mentioned:
+                continue
+            return pref, city
+        if prefecture_code:
+            return prefecture_code, ''
+        for name, (pref, city) in matches:
+            if not city:
+                return pref, ''
+        return '', ''
+
+
+_DEFAULT = None
+
+
+def default_gazetteer() -> Gazetteer:
+    global _DEFAULT
+    if _DEFAULT is None:
+        _DEFAULT = Gazetteer()
+    return _DEFAULT
+
+
+def annotate(record: dict) -> dict:
+    """prefecture_code / city_code（分かったものだけ）とlocationを付けたレコードを返す
+
+    既にlocationに都道府県名があればそれを正とする。
+    """
+    annotated = dict(record)
+    location = record.get('location', '')
+    known = f"{PREFECTURES.index(location) + 1:02d}" if location in PREFECTURES else ''
+    text = " ".join(_PUBLISHER_SUFFIX_RE.sub("", record.get(field, '') or '') for field in ('title', 'summary'))
+    pref, city = default_gazetteer().locate(text, known)
+    for field, value in (('prefecture_code', pref), ('city_code', city)):
+        if value:
+            annotated[field] = value
+        else:
+            annotated.pop(field, None)
+    if pref and not location:
+        annotated['location'] = prefecture_name(pref)
+    return annotated
+
+
+def migrate(published_path: str):
+    """保存済みレコードに所在地コードを付けて書き出す"""
+    from jsonl_store import JsonlStore
+    from publish_shards import CHILD_CASES_FILE, publish_shards
+
+    store = JsonlStore(published_path)
+    updated = []
+    total = located = 0
+    for record in store.iter_records():
+        total += 1
+        annotated = annotate(record)
+        located += 'prefecture_code' in annotated
+        if annotated != record:
+            updated.append(annotated)
+
+    print(f"📍 {total}件中 {located}件の所在地を特定（{len(updated)}件を更新）")
+    if updated:
+        store.append(updated)
+        store.compact()
+        if os.path.abspath(published_path) == os.path.abspath(CHILD_CASES_FILE):
+            publish_shards(published_path)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 2:
+        print("使い方: python scripts/gazetteer.py data/<名前>.json")
+        sys.exit(1)
+    migrate(sys.argv[1])
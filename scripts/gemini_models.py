@@ -0,0 +1,74 @@
+"""
+Geminiモデル選択の共有モジュール
+list_models()は重いので結果をプロセス内とディスクに保存し、TTL内は再取得しない
+"""
+
+import json
+import os
+import threading
+import time
+
+import google.generativeai as genai
+
+MODEL_CACHE_TTL = 6 * 3600  # 6時間
+MODEL_CACHE_FILE = os.environ.get(
+    "GEMINI_MODEL_CACHE_FILE",
+    os.path.join(os.path.expanduser("~"), ".cache", "meiyaku-knights", "gemini_model.json"),
+)
+
+_memo = {}
+_lock = threading.Lock()
+
+
+def list_generate_models() -> list:
+    """generateContentに対応したモデル名の一覧（API呼び出しあり）"""
+    return [m.name for m in genai.list_models() if 'generateContent' in m.supported_generation_methods]
+
+
+def _read_disk_cache(path: str) -> dict:
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_disk_cache(path: str, name: str):
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"model": name, "selected_at": time.time()}, f)
+        os.replace(tmp_path, path)
+    except OSError:
+        pass
+
+
+def select_model_name(preferred: list, ttl: float = MODEL_CACHE_TTL, cache_file: str = MODEL_CACHE_FILE) -> str:
+    """preferredの先頭から利用可能なモデルを選ぶ（genai.configure済みであること）
+
+    1. プロセス内メモ、2. ディスク上の前回選択結果 がTTL内ならそれを使う。
+    list_models()が失敗した場合は、期限切れでもディスクの前回選択結果を使う。
+    """
+    with _lock:
+        now = time.time()
+        if _memo and now - _memo["selected_at"] < ttl:
+            return _memo["model"]
+
+        cached = _read_disk_cache(cache_file)
+        if cached.get("model") and now - cached.get("selected_at", 0) < ttl:
+            _memo.update(cached)
+            return cached["model"]
+
+        try:
+            available = list_generate_models()
+        except Exception:
+            return cached.get("model")
+
+        selected = next((p for p in preferred if p in available), None)
+        if not selected and available:
+            selected = available[0]
+        if selected:
+            _memo.update({"model": selected, "selected_at": now})
+            _write_disk_cache(cache_file, selected)
+        return selected
@@ -0,0 +1,105 @@
+"""
+共有HTTPクライアント
+アプリと収集スクリプトで1つのrequests.Sessionを使い回し、
+ホストごとのコネクションプール・リトライ・タイムアウトを統一する
+"""
+
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# 設定
+DEFAULT_TIMEOUT = 10          # 1リクエストあたりのタイムアウト（秒）
+MAX_RETRIES = 3               # 429/5xx時の最大リトライ回数
+BACKOFF_FACTOR = 0.5          # 0.5秒, 1秒, 2秒... と指数的に待つ
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+POOL_CONNECTIONS = 10         # プールするホスト数
+POOL_MAXSIZE = 10             # ホストごとの同時接続数
+USER_AGENT = "meiyaku-knights/1.0 (+https://meiyaku-knights.com)"
+
+_session = None
+_session_lock = threading.Lock()
+_stats_lock = threading.Lock()
+_stats = {"requests": 0, "retries": 0}
+
+
+class _CountingRetry(Retry):
+    """リトライ発生回数を記録するRetry"""
+
+    def increment(self, *args, **kwargs):
+        with _stats_lock:
+            _stats["retries"] += 1
+        return super().increment(*args, **kwargs)
+
+
+def _build_session() -> requests.Session:
+    retry = _CountingRetry(
+        total=MAX_RETRIES,
+        connect=MAX_RETRIES,
+        read=MAX_RETRIES,
+        status=MAX_RETRIES,
+        backoff_factor=BACKOFF_FACTOR,
+        status_forcelist=RETRY_STATUS_CODES,
+        allowed_methods=frozenset(["GET", "HEAD"]),
+        respect_retry_after_header=True,
+        raise_on_status=False,  # 最終レスポンスをそのまま返し、呼び出し側でstatus_codeを判定
+    )
+    adapter = HTTPAdapter(max_retries=retry, pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers["User-Agent"] = USER_AGENT
+    return session
+
+
+def get_session() -> requests.Session:
+    """プロセス共有のSessionを返す（初回のみ生成）"""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = _build_session()
+    return _session
+
+
+def request(method: str, url: str, timeout: float = DEFAULT_TIMEOUT, **kwargs) -> requests.Response:
+    """共有Session経由でリクエストを送る（timeout必須）"""
+    with _stats_lock:
+        _stats["requests"] += 1
+    return get_session().request(method, url, timeout=timeout, **kwargs)
+
+
+def get(url: str, params: dict = None, timeout: float = DEFAULT_TIMEOUT, **kwargs) -> requests.Response:
+    return request("GET", url, params=params, timeout=timeout, **kwargs)
+
+
+def head(url: str, timeout: float = DEFAULT_TIMEOUT, **kwargs) -> requests.Response:
+    return request("HEAD", url, timeout=timeout, **kwargs)
+
+
+def get_stats() -> dict:
+    """リクエスト数・新規接続数・接続再利用数・リトライ数を返す"""
+    new_connections = 0
+    pooled_requests = 0
+    if _session is not None:
+        for adapter in set(_session.adapters.values()):
+            pools = adapter.poolmanager.pools
+            for key in pools.keys():
+                pool = pools.get(key)
+                if pool is None:
+                    continue
+                new_connections += pool.num_connections
+                pooled_requests += pool.num_requests
+    with _stats_lock:
+        stats = dict(_stats)
+    stats["new_connections"] = new_connections
+    stats["reused_connections"] = max(pooled_requests - new_connections, 0)
+    return stats
+
+
+def format_stats() -> str:
+    s = get_stats()
+    return (f"HTTP: {s['requests']}リクエスト / 新規接続 {s['new_connections']} / "
+            f"接続再利用 {s['reused_connections']} / リトライ {s['retries']}")
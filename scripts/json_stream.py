@@ -0,0 +1,120 @@
+"""
+LLM応答からのJSON配列の逐次抽出
+応答をチャンクごとに受け取り、トップレベル配列の要素が閉じた時点で1件ずつ返す。
+
+- 配列の前の説明文や ```json のコードフェンスは読み飛ばす
+- 壊れた要素は飛ばして errors に記録し、前後の要素は生かす
+- 末尾カンマは許容する
+- 文字列の中の括弧・カンマは数えない。全体を正規表現でやり直すことはなく、各文字を1回だけ走査する
+"""
+
+import json
+import re
+
+_TOKEN_RE = re.compile(r'[\[\]{}",\\]')
+
+
+class JsonArrayStream:
+    """feed()にテキストを順に渡すと、完成した要素のリストを返す"""
+
+    def __init__(self):
+        self._buf = ""
+        self._pos = 0              # 次に走査する位置
+        self._seg_start = None     # 現在の要素の開始位置（要素の外ならNone）
+        self._depth = 0            # トップレベル配列の内側でのネストの深さ
+        self._in_string = False
+        self._escaped_at = -1      # バックスラッシュの直後の位置（その文字は特別扱いしない）
+        self.started = False       # 配列の '[' を見つけたか
+        self.finished = False      # 対応する ']' まで読んだか
+        self.errors = []
+
+    def feed(self, chunk: str) -> list:
+        if self.finished or not chunk:
+            return []
+        self._buf += chunk
+        items = []
+
+        if not self.started:
+            start = self._buf.find("[", self._pos)
+            if start < 0:
+                self._buf, self._pos = "", 0
+                return items
+            self.started = True
+            self._pos = self._seg_start = start + 1
+
+        buf = self._buf
+        for match in _TOKEN_RE.finditer(buf, self._pos):
+            i = match.start()
+            ch = match.group()
+            if i == self._escaped_at:
+                continue
+            if self._in_string:
+                if ch == "\\":
+                    self._escaped_at = i + 1
+                elif ch == '"':
+                    self._in_string = False
+                continue
+
+            if ch == '"':
+                self._in_string = True
+            elif ch in "[{":
+                self._depth += 1
+            elif ch in "]}":
+                if self._depth == 0:
+                    if ch == "]":
+                        self._emit(buf, i, items)
+                        self.finished = True
+                        break
+                    self.errors.append(f"対応しない '}}' (位置 {i})")
+                    continue
+                self._depth -= 1
+                if self._depth == 0 and self._seg_start is not None:
+                    # オブジェクト・配列の要素は閉じた時点で返す
+                    self._emit(buf, i + 1, items)
+                    self._seg_start = None
+            elif ch == "," and self._depth == 0:
+                self._emit(buf, i, items)
+                self._seg_start = i + 1
+
+        # 走査済みで不要になった先頭部分を捨てる
+        keep = len(buf) if self._seg_start is None else self._seg_start
+        self._buf = buf[keep:]
+        self._pos = len(buf) - keep
+        if self._seg_start is not None:
+            self._seg_start = 0
+        self._escaped_at -= keep
+        return items
+
+    def _emit(self, buf: str, end: int, items: list):
+        if self._seg_start is None:
+            return
+        text = buf[self._seg_start:end].strip()
+        if not text:
+            return
+        try:
+            items.append(json.loads(text))
+        except ValueError as e:
+            self.errors.append(f"要素を解析できません: {e} ({text[:40]}...)")
+
+    def close(self):
+        """入力の終わり。配列が閉じていなければ途中の要素を切り捨てたことを記録する"""
+        if self.started and not self.finished:
+            if self._seg_start is not None and self._buf[self._seg_start:].strip():
+                self.errors.append("応答が途中で終わっています（最後の要素を破棄）")
+            else:
+                self.errors.append("配列が閉じていません")
+
+
+def iter_array_elements(chunks, stream: JsonArrayStream = None):
+    """テキストのチャンク列から配列要素を順に返す（エラーは stream.errors に残る）"""
+    stream = stream or JsonArrayStream()
+    for chunk in chunks:
+        yield from stream.feed(chunk)
+    stream.close()
+
+
+def parse_array(text: str) -> tuple:
+    """応答全体から (要素のリスト, エラーのリスト) を返す"""
+    stream = JsonArrayStream()
+    items = list(iter_array_elements([text], stream))
+    return items, stream.errors
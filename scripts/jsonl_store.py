@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+追記専用JSONLジャーナル + 公開用JSONの生成（コンパクション）
+
+収集スクリプトは新しいレコードを data/journal/<名前>.jsonl に追記するだけにし、
+サイトが読む data/<名前>.json はジャーナルから一時ファイル経由で書き出す。
+同じidのレコードを再度追記した場合は後のものが有効（更新として扱う）。
+
+使い方:
+  python scripts/jsonl_store.py compact data/child-cases.json
+"""
+
+import hashlib
+import json
+import os
+import sys
+
+JOURNAL_DIR_NAME = 'journal'
+# 上書きされた古い行がこの割合を超えたらジャーナル自体も詰め直す
+JOURNAL_REWRITE_RATIO = 0.2
+
+
+def write_atomic(path, write_fn):
+    """一時ファイルに書いてからrenameで置き換える（途中で落ちても元ファイルは壊れない）"""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            write_fn(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def iter_json_array(path, chunk_size=65536):
+    """JSON配列ファイルを全体をjson.loadせずに要素ごとに読み出す"""
+    decoder = json.JSONDecoder()
+    with open(path, 'r', encoding='utf-8') as f:
+        buf = ''
+        pos = 0
+        eof = False
+
+        def fill():
+            nonlocal buf, pos, eof
+            chunk = f.read(chunk_size)
+            eof = not chunk
+            buf = buf[pos:] + chunk
+            pos = 0
+
+        def skip_ws():
+            nonlocal pos
+            while True:
+                while pos < len(buf) and buf[pos].isspace():
+                    pos += 1
+                if pos < len(buf) or eof:
+                    return
+                fill()
+
+        fill()
+        skip_ws()
+        if pos >= len(buf):
+            return  # 空ファイル
+        if buf[pos] != '[':
+            raise ValueError(f"{path}: JSON配列ではありません")
+        pos += 1
+        skip_ws()
+        if pos < len(buf) and buf[pos] == ']':
+            return
+
+        while True:
+            skip_ws()
+            try:
+                value, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                fill()
+                continue
+            if end == len(buf) and not eof:
+                fill()  # 数値などが途中で切れている可能性があるので読み足して再解析
+                continue
+            yield value
+            pos = end
+            skip_ws()
+            if pos >= len(buf):
+                raise ValueError(f"{path}: 配列が閉じていません")
+            if buf[pos] == ']':
+                return
+            if buf[pos] != ',':
+                raise ValueError(f"{path}: 予期しない文字 {buf[pos]!r}")
+            pos += 1
+
+
+def dump_json_array(f, records):
+    """json.dump(list, indent=2) と同じ形式で1件ずつ書き出す"""
+    f.write('[')
+    first = True
+    for record in records:
+        f.write('\n  ' if first else ',\n  ')
+        f.write(json.dumps(record, ensure_ascii=False, indent=2).replace('\n', '\n  '))
+        first = False
+    f.write('\n]' if not first else ']')
+
+
+class JsonlStore:
+    """1データセット分のジャーナルと公開JSON"""
+
+    def __init__(self, published_path, key='id'):
+        self.published_path = published_path
+        self.key = key
+        name = os.path.splitext(os.path.basename(published_path))[0]
+        journal_dir = os.path.join(os.path.dirname(published_path), JOURNAL_DIR_NAME)
+        self.journal_path = os.path.join(journal_dir, f"{name}.jsonl")
+        self.meta_path = os.path.join(journal_dir, f"{name}.meta.json")
+
+    def _published_hash(self):
+        digest = hashlib.sha256()
+        with open(self.published_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(65536), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def _write_meta(self):
+        meta = {"published_sha256": self._published_hash()}
+        write_atomic(self.meta_path, lambda f: json.dump(meta, f, indent=2))
+
+    def _ensure_journal(self):
+        """ジャーナルがなければ公開JSONから作る
+
+        公開JSONが前回のコンパクション後に手で編集されていた場合も、公開JSONを正として作り直す。
+        """
+        if os.path.exists(self.journal_path):
+            if not os.path.exists(self.published_path) or not os.path.exists(self.meta_path):
+                return
+            with open(self.meta_path, 'r', encoding='utf-8') as f:
+                if json.load(f).get("published_sha256") == self._published_hash():
+                    return
+            print(f"ℹ️ {self.published_path} が手動で更新されているため、ジャーナルを作り直します")
+        records = iter_json_array(self.published_path) if os.path.exists(self.published_path) else []
+        write_atomic(self.journal_path, lambda f: f.writelines(
+            json.dumps(r, ensure_ascii=False) + '\n' for r in records))
+        if os.path.exists(self.published_path):
+            self._write_meta()
+
+    def _iter_lines(self):
+        """(バイトオフセット, レコード) を順に返す（書きかけの末尾行は無視）"""
+        with open(self.journal_path, 'rb') as f:
+            offset = 0
+            for line in f:
+                start = offset
+                offset += len(line)
+                if not line.endswith(b'\n'):
+                    break
+                if line.strip():
+                    yield start, json.loads(line)
+
+    def _index(self):
+        """キー -> (初出順, 最新行のオフセット) と、上書きされた行数"""
+        index = {}
+        superseded = 0
+        for seq, (offset, record) in enumerate(self._iter_lines()):
+            key = record.get(self.key, f"#{seq}")
+            if key in index:
+                index[key] = (index[key][0], offset)
+                superseded += 1
+            else:
+                index[key] = (seq, offset)
+        return index, superseded
+
+    def iter_records(self):
+        """キーごとの最新レコードを初出順にストリームで返す"""
+        self._ensure_journal()
+        index, _ = self._index()
+        offsets = [offset for _, offset in sorted(index.values())]
+        with open(self.journal_path, 'rb') as f:
+            for offset in offsets:
+                f.seek(offset)
+                yield json.loads(f.readline())
+
+    def append(self, records):
+        """レコードをジャーナル末尾に追記"""
+        self._ensure_journal()
+        with open(self.journal_path, 'rb+') as f:
+            end = f.seek(0, os.SEEK_END)
+            if end:
+                f.seek(end - 1)
+                if f.read(1) != b'\n':
+                    # 前回の書きかけ行を切り詰める（異常終了時のみ）
+                    f.seek(0)
+                    f.truncate(f.read().rfind(b'\n') + 1)
+            f.seek(0, os.SEEK_END)
+            for record in records:
+                f.write((json.dumps(record, ensure_ascii=False) + '\n').encode('utf-8'))
+            f.flush()
+            os.fsync(f.fileno())
+
+    def compact(self):
+        """ジャーナルから公開JSONを書き出す。上書きされた古い行が多ければジャーナルも詰め直す。件数を返す"""
+        self._ensure_journal()
+        index, superseded = self._index()
+
+        write_atomic(self.published_path, lambda f: dump_json_array(f, self.iter_records()))
+        self._write_meta()
+
+        if index and superseded / len(index) > JOURNAL_REWRITE_RATIO:
+            write_atomic(self.journal_path, lambda f: f.writelines(
+                json.dumps(r, ensure_ascii=False) + '\n' for r in self.iter_records()))
+        return len(index)
+
+
+def main():
+    if len(sys.argv) != 3 or sys.argv[1] != 'compact':
+        print("使い方: python scripts/jsonl_store.py compact data/<名前>.json")
+        sys.exit(1)
+    count = JsonlStore(sys.argv[2]).compact()
+    print(f"✅ {count}件を {sys.argv[2]} に書き出しました")
+
+
+if __name__ == '__main__':
+    main()
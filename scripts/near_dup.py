@@ -0,0 +1,146 @@
+"""
+記事タイトルの近似重複検出（SimHash + LSH）
+同じニュースがNHK・毎日・Google News経由など別URLで届いても1件にまとめるために使う
+
+- タイトルを正規化（末尾の「 - 媒体名」除去、NFKC、記号・空白除去）して文字bigramのSimHashを取る
+- 64bitのSimHashを16ビット×4バンドに分け、どれかのバンドが一致したものだけを候補にする（全件比較しない）
+  バンドごとのバケットは65536通りなので、候補数は件数が増えてもほとんど増えない
+  （ハミング距離3以内なら必ずどれかのバンドが一致する）
+- インデックスは data/journal/<名前>.simhash.json に保存し、レコードを書き込む収集スクリプトがすべて更新する
+- 候補はbigramのJaccard係数と日付の近さで最終判定する
+"""
+
+import hashlib
+import json
+import os
+import re
+import unicodedata
+from collections import defaultdict
+from datetime import datetime
+
+from jsonl_store import write_atomic
+
+SIMHASH_BITS = 64
+BANDS = 4
+BAND_BITS = SIMHASH_BITS // BANDS
+JACCARD_THRESHOLD = 0.75
+MIN_TITLE_LENGTH = 10     # これより短いタイトル（「児童虐待防止」など）は汎用的すぎるので判定しない
+MAX_DAYS_APART = 7
+
+_PUBLISHER_SUFFIX_RE = re.compile(r"\s+[-‐－|｜]\s+[^-‐－|｜]{1,30}$")
+_NON_WORD_RE = re.compile(r"[\W_]+")
+
+
+def normalize_title(title: str) -> str:
+    title = _PUBLISHER_SUFFIX_RE.sub("", title or "")
+    title = unicodedata.normalize("NFKC", title).lower()
+    return _NON_WORD_RE.sub("", title)
+
+
+def shingles(text: str) -> set:
+    return {text[i:i + 2] for i in range(len(text) - 1)} or {text}
+
+
+def _feature_hash(feature: str) -> int:
+    # hash()は実行ごとに変わるので、永続化できる固定のハッシュを使う
+    return int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def simhash(features: set) -> int:
+    weights = [0] * SIMHASH_BITS
+    for feature in features:
+        h = _feature_hash(feature)
+        for bit in range(SIMHASH_BITS):
+            weights[bit] += 1 if h >> bit & 1 else -1
+    return sum(1 << bit for bit, w in enumerate(weights) if w > 0)
+
+
+def jaccard(a: set, b: set) -> float:
+    return len(a & b) / len(a | b) if a and b else 0.0
+
+
+def _bands(h: int):
+    mask = (1 << BAND_BITS) - 1
+    for band in range(BANDS):
+        yield band, (h >> (band * BAND_BITS)) & mask
+
+
+def _days_apart(a: str, b: str) -> int:
+    try:
+        return abs((datetime.strptime(a, "%Y-%m-%d") - datetime.strptime(b, "%Y-%m-%d")).days)
+    except (TypeError, ValueError):
+        return 0  # 日付不明なら日付では除外しない
+
+
+class NearDupIndex:
+    """レコードID -> (SimHash, 正規化タイトル, 日付) と、バンドごとのLSHバケット"""
+
+    def __init__(self):
+        self._entries = {}
+        self._buckets = defaultdict(list)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def add(self, record_id, title: str, date: str = ""):
+        normalized = normalize_title(title)
+        if len(normalized) < MIN_TITLE_LENGTH or record_id in self._entries:
+            return
+        self._insert(record_id, simhash(shingles(normalized)), normalized, date)
+
+    def _insert(self, record_id, h: int, normalized: str, date: str):
+        self._entries[record_id] = (h, normalized, date)
+        for band in _bands(h):
+            self._buckets[band].append(record_id)
+
+    def find(self, title: str, date: str = ""):
+        """近似重複するレコードのIDを返す（なければNone）"""
+        normalized = normalize_title(title)
+        if len(normalized) < MIN_TITLE_LENGTH:
+            return None
+        grams = shingles(normalized)
+        h = simhash(grams)
+        candidates = dict.fromkeys(rid for band in _bands(h) for rid in self._buckets.get(band, ()))
+        best_id, best_score = None, 0.0
+        for rid in candidates:
+            _, other, other_date = self._entries[rid]
+            if _days_apart(date, other_date) > MAX_DAYS_APART:
+                continue
+            score = jaccard(grams, shingles(other))
+            if score >= JACCARD_THRESHOLD and score > best_score:
+                best_id, best_score = rid, score
+        return best_id
+
+    @classmethod
+    def load(cls, path: str):
+        index = cls()
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for rid, (h, normalized, date) in json.load(f)["entries"].items():
+                    index._insert(int(rid) if rid.isdigit() else rid, int(h, 16), normalized, date)
+        return index
+
+    def save(self, path: str):
+        entries = {str(rid): [f"{h:016x}", normalized, date] for rid, (h, normalized, date) in self._entries.items()}
+        write_atomic(path, lambda f: json.dump({"version": 1, "entries": entries}, f,
+                                               ensure_ascii=False, separators=(",", ":")))
+
+
+def index_path(published_path: str) -> str:
+    """公開JSONに対応するインデックスのパス（data/child-cases.json → data/journal/child-cases.simhash.json）"""
+    name = os.path.splitext(os.path.basename(published_path))[0]
+    return os.path.join(os.path.dirname(published_path), "journal", f"{name}.simhash.json")
+
+
+def update_index(published_path: str, records):
+    """保存したレコードをインデックスに追加する
+
+    インデックスがまだない場合は何もしない（次にRSS収集が読み込むときに全件から作り直す）。
+    """
+    path = index_path(published_path)
+    if not os.path.exists(path):
+        return
+    index = NearDupIndex.load(path)
+    for record in records:
+        index.add(record["id"], record.get("title", ""), record.get("date", ""))
+    index.save(path)
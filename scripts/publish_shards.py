@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+子ども事件データを月別・都道府県別のシャードに分けて公開する
+
+出力（data/child-cases/）:
+  manifest.json              件数・ハッシュ・パスの一覧
+  by-month/YYYY-MM.json      月ごとのレコード（新しい月から順にページとして使える）
+  by-prefecture/NN.json      都道府県コード(JIS X 0401)ごとのレコード（00 = 不明、0件でも出力）
+
+使い方:
+  python scripts/publish_shards.py
+"""
+
+import hashlib
+import json
+import os
+import re
+from collections import defaultdict
+
+from cache_keys import PREFECTURES
+from gazetteer import annotate
+from jsonl_store import JsonlStore, write_atomic
+
+DATA_DIR = 'data'
+CHILD_CASES_FILE = os.path.join(DATA_DIR, 'child-cases.json')
+UNKNOWN_PREFECTURE = '00'
+UNKNOWN_MONTH = 'unknown'
+
+_MONTH_RE = re.compile(r'^\d{4}-\d{2}')
+
+
+def prefecture_code(name: str) -> str:
+    """都道府県名 → 2桁コード（北海道 = 01 ... 沖縄県 = 47）"""
+    return f"{PREFECTURES.index(name) + 1:02d}" if name in PREFECTURES else UNKNOWN_PREFECTURE
+
+
+def record_prefecture_code(record: dict) -> str:
+    """収集時に付けたprefecture_code。付いていない古いレコードは地名辞書で判定する"""
+    if record.get('prefecture_code'):
+        return record['prefecture_code']
+    return annotate(record).get('prefecture_code', UNKNOWN_PREFECTURE)
+
+
+def record_month(record: dict) -> str:
+    date = str(record.get('date', ''))
+    return date[:7] if _MONTH_RE.match(date) else UNKNOWN_MONTH
+
+
+def shard_dir(published_path: str) -> str:
+    return os.path.splitext(published_path)[0]
+
+
+def _shard_bytes(records: list) -> bytes:
+    return json.dumps(records, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def _write_shard(base_dir: str, rel_path: str, payload: bytes, previous: dict) -> dict:
+    """内容が変わったシャードだけ書き直し、マニフェスト用の情報を返す"""
+    sha256 = hashlib.sha256(payload).hexdigest()
+    path = os.path.join(base_dir, rel_path)
+    if previous.get('sha256') != sha256 or not os.path.exists(path):
+        write_atomic(path, lambda f: f.write(payload.decode('utf-8')))
+    return {"path": rel_path, "sha256": sha256, "bytes": len(payload)}
+
+
+def publish_shards(published_path: str = CHILD_CASES_FILE) -> dict:
+    """ジャーナルの全レコードを1回走査してシャードとマニフェストを書き出す"""
+    base_dir = shard_dir(published_path)
+    manifest_path = os.path.join(base_dir, 'manifest.json')
+    previous = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            old = json.load(f)
+        for section in ('months', 'prefectures'):
+            for entry in old.get(section, []):
+                previous[entry['path']] = entry
+
+    by_month = defaultdict(list)
+    by_prefecture = defaultdict(list)
+    total = 0
+    for record in JsonlStore(published_path).iter_records():
+        total += 1
+        by_month[record_month(record)].append(record)
+        by_prefecture[record_prefecture_code(record)].append(record)
+
+    months = []
+    for month in sorted(by_month, reverse=True):
+        rel_path = f"by-month/{month}.json"
+        entry = _write_shard(base_dir, rel_path, _shard_bytes(by_month[month]), previous.get(rel_path, {}))
+        months.append({"month": month, "count": len(by_month[month]), **entry})
+
+    # 該当0件の都道府県も空のシャードを出す（利用側で404にならないように）
+    prefectures = []
+    for code in [UNKNOWN_PREFECTURE] + [prefecture_code(name) for name in PREFECTURES]:
+        rel_path = f"by-prefecture/{code}.json"
+        entry = _write_shard(base_dir, rel_path, _shard_bytes(by_prefecture[code]), previous.get(rel_path, {}))
+        name = PREFECTURES[int(code) - 1] if code != UNKNOWN_PREFECTURE else '不明'
+        prefectures.append({"code": code, "name": name, "count": len(by_prefecture[code]), **entry})
+
+    # 今回出力しなかった古いシャードを削除
+    current = {entry['path'] for entry in months + prefectures}
+    for rel_path in previous:
+        if rel_path not in current and os.path.exists(os.path.join(base_dir, rel_path)):
+            os.remove(os.path.join(base_dir, rel_path))
+
+    manifest = {
+        "total": total,
+        "months": months,
+        "prefectures": prefectures,
+    }
+    write_atomic(manifest_path, lambda f: json.dump(manifest, f, ensure_ascii=False, indent=2))
+    print(f"🗂️ シャード出力: {len(months)}か月 / {len(prefectures)}都道府県 ({total}件) → {base_dir}")
+    return manifest
+
+
+if __name__ == '__main__':
+    publish_shards()
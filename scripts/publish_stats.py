@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+公開データの集計ファイルを出力する
+全件を読まなくても件数の概要を表示できるよう、ジャーナルを1回走査して数KBの集計を書き出す
+
+出力（data/<名前>-stats.json）:
+  total                  全件数
+  by_prefecture          都道府県コードごとの件数（00 = 不明）
+  by_month / by_tag / by_source   月・タグ・媒体ごとの件数
+  recent_by_prefecture   都道府県ごとの新しい順の上位N件（id, date, title）
+
+使い方:
+  python scripts/publish_stats.py data/child-cases.json
+"""
+
+import heapq
+import json
+import os
+import sys
+from collections import Counter, defaultdict
+
+from gazetteer import prefecture_name
+from jsonl_store import JsonlStore, write_atomic
+from publish_shards import UNKNOWN_PREFECTURE, record_month, record_prefecture_code
+
+RECENT_PER_PREFECTURE = 5
+
+
+def stats_path(published_path: str) -> str:
+    return f"{os.path.splitext(published_path)[0]}-stats.json"
+
+
+def _ranked(counter: Counter) -> dict:
+    """件数の多い順（同数は名前順）"""
+    return dict(sorted(counter.items(), key=lambda kv: (-kv[1], kv[0])))
+
+
+def compute_stats(records) -> dict:
+    """レコードを1回走査して集計する"""
+    total = 0
+    by_prefecture = Counter()
+    by_month = Counter()
+    by_tag = Counter()
+    by_source = Counter()
+    recent = defaultdict(list)  # 都道府県コード -> (日付, 連番, 概要) の最小ヒープ（上位N件を保持）
+
+    for seq, record in enumerate(records):
+        total += 1
+        code = record_prefecture_code(record)
+        by_prefecture[code] += 1
+        by_month[record_month(record)] += 1
+        by_tag.update(tag for tag in record.get('tags', []) if tag)
+        if record.get('source'):
+            by_source[record['source']] += 1
+
+        entry = (str(record.get('date', '')), seq, {
+            "id": record.get('id'),
+            "date": record.get('date', ''),
+            "title": record.get('title', ''),
+        })
+        heap = recent[code]
+        if len(heap) < RECENT_PER_PREFECTURE:
+            heapq.heappush(heap, entry)
+        elif entry[:2] > heap[0][:2]:
+            heapq.heapreplace(heap, entry)
+
+    return {
+        "total": total,
+        "by_prefecture": [
+            {"code": code, "name": prefecture_name(code) or '不明', "count": by_prefecture[code]}
+            for code in sorted(by_prefecture)
+        ],
+        "by_month": dict(sorted(by_month.items(), reverse=True)),
+        "by_tag": _ranked(by_tag),
+        "by_source": _ranked(by_source),
+        "recent_by_prefecture": {
+            code: [item for _, _, item in sorted(recent[code], key=lambda e: e[:2], reverse=True)]
+            for code in sorted(recent) if code != UNKNOWN_PREFECTURE
+        },
+    }
+
+
+def publish_stats(published_path: str) -> dict:
+    stats = compute_stats(JsonlStore(published_path).iter_records())
+    path = stats_path(published_path)
+    write_atomic(path, lambda f: json.dump(stats, f, ensure_ascii=False, separators=(',', ':')))
+    print(f"📈 集計出力: {stats['total']}件 / タグ{len(stats['by_tag'])}種 → {path} ({os.path.getsize(path):,}バイト)")
+    return stats
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 2:
+        print("使い方: python scripts/publish_stats.py data/<名前>.json")
+        sys.exit(1)
+    publish_stats(sys.argv[1])
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+収集レコードのテキスト正規化
+HTMLタグの除去 → 文字実体参照のデコード → NFKC正規化 → 空白の整理 → フィールドごとのバイト数上限
+
+Google NewsのRSSはsummaryに <a href=...> や <font> のHTMLを入れてくるため、
+そのまま保存すると公開JSONが膨らみ、サイトの読み込みや検索のたびに余計な文字列を扱うことになる。
+
+使い方（保存済みデータの一括移行。変更のあったレコードだけを追記して書き出す）:
+  python scripts/record_normalize.py data/child-cases.json
+"""
+
+import html
+import os
+import re
+import sys
+import unicodedata
+
+# フィールドごとのUTF-8バイト数の上限（日本語は1文字3バイト。titleは約50文字、summaryは約150文字）
+FIELD_BYTE_BUDGETS = {
+    "title": 150,
+    "summary": 450,
+    "location": 30,
+    "source": 60,
+}
+ELLIPSIS = "…"
+
+# タグは「<」の直後が英字・/・! のものだけ（本文中の「<」はfeedparserでデコード済みのことがあるため）
+_BLOCK_TAG_RE = re.compile(r"</?(?:br|p|div|li|ul|ol|tr|td|th|table|h[1-6])\b[^>]*>", re.IGNORECASE)
+_TAG_RE = re.compile(r"<[A-Za-z/!][^>]*>")
+_UNCLOSED_TAG_RE = re.compile(r"<[A-Za-z/!][^>]*$")  # 切り詰めで閉じていない末尾のタグ
+_SPACE_RE = re.compile(r"\s+")
+_ANGLE_BRACKETS = str.maketrans({"<": "＜", ">": "＞"})
+# タイトル末尾の「 - 媒体名」（Google Newsのタイトル形式）
+_TITLE_PUBLISHER_RE = re.compile(r"\s+[-‐－|｜]\s+(?P<publisher>[^-‐－|｜]{1,30})$")
+
+
+def strip_markup(text: str) -> str:
+    """HTMLタグを除き、文字実体参照をデコードしてNFKC正規化する
+
+    <b> や <a> のようなインラインのタグは語を分けないよう空文字に、改行・段落のタグは空白にする。
+
+    >>> strip_markup('<b>千葉県</b>木更津市で<br>事件')
+    '千葉県木更津市で 事件'
+    >>> strip_markup('要件 a < b の場合')
+    '要件 a ＜ b の場合'
+    >>> strip_markup('記事の概要 <a href="https://exa')
+    '記事の概要'
+    """
+    text = _BLOCK_TAG_RE.sub(" ", text or "")
+    text = _UNCLOSED_TAG_RE.sub("", _TAG_RE.sub("", text))
+    text = html.unescape(text)
+    text = unicodedata.normalize("NFKC", text)
+    # サイトはtitle・summaryをそのままinnerHTMLに入れるので、本文中の「＜未解決事件＞」のような括弧は
+    # NFKCで半角になってもタグと解釈されないよう全角に戻す
+    text = text.translate(_ANGLE_BRACKETS)
+    return _SPACE_RE.sub(" ", text).strip()
+
+
+def truncate_bytes(text: str, max_bytes: int) -> str:
+    """UTF-8でmax_bytes以内に収まるよう文字単位で切り詰める（切った場合は末尾に…）"""
+    encoded = text.encode("utf-8")
+    if len(encoded) <= max_bytes:
+        return text
+    budget = max_bytes - len(ELLIPSIS.encode("utf-8"))
+    return encoded[:budget].decode("utf-8", errors="ignore").rstrip() + ELLIPSIS
+
+
+def normalize_text(text: str, field: str) -> str:
+    text = strip_markup(text)
+    budget = FIELD_BYTE_BUDGETS.get(field)
+    return truncate_bytes(text, budget) if budget else text
+
+
+def normalize_record(record: dict) -> dict:
+    """テキスト項目を正規化したレコードを返す（元のレコードは変更しない）
+
+    summaryがタイトル（+媒体名）の繰り返しにすぎない場合はタイトルと同じにする。
+    Google Newsはタイトルが「見出し - 媒体名」、summaryが「見出し 媒体名」なので、
+    比較の前にタイトル末尾の媒体名を外す。
+
+    >>> record = normalize_record({
+    ...     "title": "児童虐待の疑いで父親逮捕 - 毎日新聞",
+    ...     "summary": '<a href="https://news.google.com/x">児童虐待の疑いで父親逮捕</a>&nbsp;&nbsp;<font color="#6f6f6f">毎日新聞</font>',
+    ...     "source": "Google News",
+    ... })
+    >>> record["summary"] == record["title"]
+    True
+    """
+    normalized = dict(record)
+    for field in FIELD_BYTE_BUDGETS:
+        if isinstance(record.get(field), str):
+            normalized[field] = normalize_text(record[field], field)
+
+    title = normalized.get("title", "")
+    summary = normalized.get("summary", "")
+    publishers = {"", normalized.get("source", "")}
+    headline = title
+    match = _TITLE_PUBLISHER_RE.search(title)
+    if match:
+        headline = title[:match.start()]
+        publishers.add(match.group("publisher").strip())
+    if not summary or any(head and summary.startswith(head) and summary[len(head):].strip() in publishers
+                          for head in (title, headline)):
+        normalized["summary"] = title
+    return normalized
+
+
+def migrate(published_path: str):
+    """保存済みレコードを正規化して書き出し、サイズの変化を表示する"""
+    from jsonl_store import JsonlStore
+    from publish_shards import CHILD_CASES_FILE, publish_shards
+
+    before = os.path.getsize(published_path)
+    store = JsonlStore(published_path)
+    updated = []
+    total = 0
+    for record in store.iter_records():
+        total += 1
+        normalized = normalize_record(record)
+        if normalized != record:
+            updated.append(normalized)
+
+    if not updated:
+        print(f"ℹ️ {total}件とも正規化済みです")
+        return
+    store.append(updated)
+    store.compact()
+    if os.path.abspath(published_path) == os.path.abspath(CHILD_CASES_FILE):
+        publish_shards(published_path)
+
+    after = os.path.getsize(published_path)
+    print(f"✅ {total}件中 {len(updated)}件を正規化しました")
+    print(f"📉 {published_path}: {before:,} → {after:,} バイト ({(before - after) / before:.1%} 削減)")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print("使い方: python scripts/record_normalize.py data/<名前>.json")
+        sys.exit(1)
+    migrate(sys.argv[1])
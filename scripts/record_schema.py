@@ -0,0 +1,84 @@
+"""
+収集レコードの型定義と検証
+Geminiに渡すレスポンススキーマ（JSONモード）と、受け取った各要素の検証を同じ定義から作る
+"""
+
+import re
+
+_DATE_RE = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+
+# (フィールド名, 型, 必須か)
+# 型: "string" | "date"（YYYY-MM-DD）| "url"（http/https）| "tags"（文字列の配列）
+JUDGMENT_FIELDS = [
+    ("date", "date", True),
+    ("court", "string", True),
+    ("title", "string", True),
+    ("tags", "tags", True),
+    ("summary", "string", True),
+    ("url", "url", True),
+]
+
+CHILD_CASE_FIELDS = [
+    ("date", "date", True),
+    ("location", "string", True),
+    ("title", "string", True),
+    ("tags", "tags", True),
+    ("summary", "string", True),
+    ("url", "url", True),
+    ("source", "string", False),
+]
+
+
+def response_schema(fields) -> dict:
+    """generation_configのresponse_schemaに渡す配列スキーマ"""
+    properties = {}
+    for name, kind, _ in fields:
+        if kind == "tags":
+            properties[name] = {"type": "ARRAY", "items": {"type": "STRING"}}
+        else:
+            properties[name] = {"type": "STRING"}
+    return {
+        "type": "ARRAY",
+        "items": {
+            "type": "OBJECT",
+            "properties": properties,
+            "required": [name for name, _, required in fields if required],
+        },
+    }
+
+
+def validate(item, fields) -> tuple:
+    """1件を検証して (整形済みレコード or None, エラーのリスト) を返す
+
+    スキーマにないフィールドは捨てる。値の前後の空白は除く。
+    """
+    if not isinstance(item, dict):
+        return None, [f"オブジェクトではありません: {type(item).__name__}"]
+
+    record = {}
+    errors = []
+    for name, kind, required in fields:
+        value = item.get(name)
+        if value is None or value == "" or value == []:
+            if required:
+                errors.append(f"{name}: 必須です")
+            continue
+        if kind == "tags":
+            if not isinstance(value, list) or not all(isinstance(tag, str) for tag in value):
+                errors.append(f"{name}: 文字列の配列ではありません")
+                continue
+            value = [tag.strip() for tag in value if tag.strip()]
+        else:
+            if not isinstance(value, str):
+                errors.append(f"{name}: 文字列ではありません")
+                continue
+            value = value.strip()
+            if kind == "date" and not _DATE_RE.match(value):
+                errors.append(f"{name}: YYYY-MM-DD形式ではありません ({value})")
+                continue
+            if kind == "url" and not value.startswith(("http://", "https://")):
+                errors.append(f"{name}: URLではありません ({value})")
+                continue
+        record[name] = value
+
+    return (None, errors) if errors else (record, [])
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+school_risk_cache の search_key を現在の正規化ルール（cache_keys.py）で付け直す移行ツール
+表記ゆれで分かれていた行は、最新の行を残して access_count を合算する
+
+使い方:
+  SUPABASE_URL=... SUPABASE_KEY=... python scripts/rehash_school_cache.py --dry-run
+  SUPABASE_URL=... SUPABASE_KEY=... python scripts/rehash_school_cache.py
+"""
+
+import os
+import sys
+from collections import defaultdict
+
+from supabase import create_client
+
+import cache_keys
+
+TABLE = "school_risk_cache"
+PAGE_SIZE = 1000
+
+
+def fetch_all_rows(client) -> list:
+    rows = []
+    start = 0
+    while True:
+        response = (client.table(TABLE)
+                    .select("id, school_name, prefecture, search_key, access_count, updated_at")
+                    .order("id")
+                    .range(start, start + PAGE_SIZE - 1)
+                    .execute())
+        rows.extend(response.data or [])
+        if len(response.data or []) < PAGE_SIZE:
+            return rows
+        start += PAGE_SIZE
+
+
+def plan_rehash(rows: list) -> list:
+    """新しいキーごとに (新キー, 残す行, 削除する行リスト, 合算access_count) を返す"""
+    groups = defaultdict(list)
+    for row in rows:
+        new_key = cache_keys.generate_cache_key(row.get("school_name", ""), row.get("prefecture") or cache_keys.NO_PREFECTURE)
+        groups[new_key].append(row)
+
+    plan = []
+    for new_key, group in groups.items():
+        group.sort(key=lambda r: (r.get("updated_at") or "", r["id"]), reverse=True)
+        keeper, duplicates = group[0], group[1:]
+        total_access = sum(r.get("access_count") or 0 for r in group)
+        if keeper["search_key"] != new_key or duplicates:
+            plan.append((new_key, keeper, duplicates, total_access))
+    return plan
+
+
+def main():
+    dry_run = "--dry-run" in sys.argv[1:]
+    url = os.environ.get("SUPABASE_URL")
+    key = os.environ.get("SUPABASE_KEY")
+    if not url or not key:
+        print("Error: SUPABASE_URL / SUPABASE_KEY environment variables not set")
+        sys.exit(1)
+
+    client = create_client(url, key)
+    rows = fetch_all_rows(client)
+    plan = plan_rehash(rows)
+
+    merged_rows = sum(len(duplicates) for _, _, duplicates, _ in plan)
+    merged_hits = sum(sum(r.get("access_count") or 0 for r in duplicates) for _, _, duplicates, _ in plan)
+    print(f"📋 行数: {len(rows)} → {len(rows) - merged_rows}（統合 {merged_rows}行 / 付け直し {len(plan)}キー）")
+    print(f"📈 統合される過去アクセス数: {merged_hits}（これまで別キーで分析し直していた回数の目安）")
+
+    for new_key, keeper, duplicates, total_access in plan:
+        names = ", ".join(f"{r['school_name']}({r.get('prefecture') or '-'})" for r in [keeper] + duplicates)
+        print(f"  🔑 {new_key[:8]}: {names}")
+        if dry_run:
+            continue
+        # UNIQUE制約があるので、先に重複行を消してからキーを付け直す
+        for row in duplicates:
+            client.table(TABLE).delete().eq("id", row["id"]).execute()
+        client.table(TABLE).update({
+            "search_key": new_key,
+            "access_count": total_access,
+        }).eq("id", keeper["id"]).execute()
+
+    print("ℹ️ --dry-run のため変更していません" if dry_run else "✅ 移行完了")
+
+
+if __name__ == "__main__":
+    main()
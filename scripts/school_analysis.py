@@ -0,0 +1,259 @@
+"""
+学校リスク予報の検索＋分析パイプライン（Streamlitに依存しない部分）
+アプリ（streamlit_app.py）とキャッシュ事前生成ジョブ（scripts/warm_school_cache.py）の両方から使う。
+ここでは st.* を呼ばない。エラーは例外または戻り値で返し、表示は呼び出し側で行う。
+"""
+
+import base64
+import gzip
+import html
+import re
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime, timezone
+
+import http_client
+
+SEARCH_DEADLINE_SECONDS = 12  # 並列検索全体の締め切り
+SEARCH_RESULTS_PER_QUERY = 3
+MAX_DISPLAYED_RESULTS = 8
+
+# 親目線の多角的なクエリ
+SEARCH_QUERY_TEMPLATES = [
+    "{school_name} 事件 いじめ",
+    "{school_name} 口コミ 評判",
+    "{school_name} 不審者 治安",
+]
+
+PREFERRED_GEMINI_MODELS = ['models/gemini-1.5-flash', 'models/gemini-1.5-pro', 'models/gemini-pro']
+
+# 旧形式の検索結果HTML（エスケープせずに組み立てていた頃の render_search_results_html と同じ構造）
+_LEGACY_RESULT_RE = re.compile(
+    r'<a href="(?P<link>[^"]*)" target="_blank">(?P<title>.*?)</a>\s*<p>(?P<snippet>.*?)(?:\.\.\.)?</p>',
+    re.DOTALL,
+)
+
+# school_risk_cache から読む列（旧形式の ai_result / search_results は移行前の行のみ値を持つ）
+CACHE_COLUMNS = "search_key, school_name, prefecture, updated_at, ai_result_gz, search_results_json, ai_result, search_results"
+
+
+def build_queries(school_name: str) -> list:
+    return [template.format(school_name=school_name) for template in SEARCH_QUERY_TEMPLATES]
+
+
+def fetch_google_results(query: str, num_results: int, api_key: str, cx: str) -> list:
+    """Google Custom Search APIを1回呼び出す"""
+    url = "https://www.googleapis.com/customsearch/v1"
+    params = {
+        "key": api_key,
+        "cx": cx,
+        "q": query,
+        "num": num_results,
+        "lr": "lang_ja"
+    }
+
+    response = http_client.get(url, params=params, timeout=10)
+
+    if response.status_code != 200:
+        error_data = response.json()
+        error_msg = error_data.get("error", {}).get("message", "Unknown error")
+        raise RuntimeError(f"Google API エラー: {error_msg}")
+
+    data = response.json()
+    results = []
+    for item in data.get("items", []):
+        results.append({
+            "title": item.get("title", ""),
+            "link": item.get("link", ""),
+            "snippet": item.get("snippet", "")
+        })
+    return results
+
+
+def google_search(queries: list, api_key: str, cx: str, num_results: int = SEARCH_RESULTS_PER_QUERY,
+                  deadline: float = SEARCH_DEADLINE_SECONDS) -> tuple:
+    """複数クエリを並列にGoogle検索し、クエリ順・link重複なしでマージ
+
+    一部のクエリが失敗・締め切り超過しても、取得できた分だけ返す。
+    戻り値: (検索結果のリスト, エラーメッセージのリスト（重複なし）)
+    """
+    executor = ThreadPoolExecutor(max_workers=len(queries) or 1)
+    futures = [executor.submit(fetch_google_results, q, num_results, api_key, cx) for q in queries]
+    wait(futures, timeout=deadline)
+    # 締め切りを過ぎたクエリは待たずに打ち切る
+    executor.shutdown(wait=False, cancel_futures=True)
+
+    all_results = []
+    seen_links = set()
+    errors = []
+    for q, future in zip(queries, futures):
+        if not future.done():
+            errors.append(f"検索タイムアウト: {q}")
+            continue
+        try:
+            results = future.result()
+        except Exception as e:
+            errors.append(str(e))
+            continue
+        for r in results:
+            if r["link"] not in seen_links:
+                all_results.append(r)
+                seen_links.add(r["link"])
+    return all_results, list(dict.fromkeys(errors))
+
+
+def render_search_results_html(results: list, limit: int = MAX_DISPLAYED_RESULTS) -> str:
+    """検索結果を表示用のHTMLにする（キャッシュには構造化したまま保存し、表示時に組み立てる）"""
+    rendered = ""
+    for r in results[:limit]:
+        rendered += f"""
+            <div class="search-result">
+                <a href="{html.escape(r['link'])}" target="_blank">{html.escape(r['title'])}</a>
+                <p>{html.escape(r['snippet'][:150])}...</p>
+            </div>
+            """
+    return rendered
+
+
+def build_analysis_prompt(school_name: str, prefecture: str, search_results: list) -> str:
+    """Google検索結果から分析用プロンプトを組み立てる"""
+    location = f"{prefecture}の" if prefecture != "指定なし" else ""
+
+    # 検索結果をテキスト化
+    search_text = ""
+    for i, r in enumerate(search_results, 1):
+        search_text += f"{i}. {r['title']}\n   URL: {r['link']}\n   概要: {r['snippet']}\n\n"
+
+    if not search_text:
+        search_text = "検索結果が見つかりませんでした。"
+
+    prompt = f"""
+あなたは学校の安全性と教育環境を分析する専門家AIです。
+以下のGoogle検索結果を元に、{location}{school_name}の詳細分析を行ってください。
+
+【Google検索結果】
+{search_text}
+
+【分析項目】親の視点で以下を詳しく分析してください：
+
+1. **安全性・事件情報**
+   - 過去の事件・事故・いじめ報道
+   - 学校の対応姿勢（隠蔽傾向 or 透明性）
+
+2. **地域の治安**
+   - 不審者情報の有無
+   - 通学路の安全性
+   - 周辺の犯罪発生状況
+
+3. **教育環境**
+   - 学力水準・進学実績（情報があれば）
+   - 部活動の充実度
+   - 特別支援・発達障害への対応
+
+4. **保護者の評判**
+   - 口コミサイトでの評価
+   - 先生の評判
+   - PTA活動の負担感
+
+5. **子育て環境**
+   - 学童保育の状況
+   - 周辺の習い事・塾
+   - 地域コミュニティの活発さ
+
+【出力形式】
+## 🎯 総合評価
+[安心/注意必要/要警戒/情報不足] と理由を1-2文で
+
+## 🚨 安全性・事件情報
+（発見された記事はURLを含めて記載。なければ「重大な事件報道は見つかりませんでした」）
+
+## 🏘️ 地域の治安
+- 不審者情報: 
+- 通学路: 
+- 周辺治安: 
+
+## 📚 教育環境
+- 学力: 
+- 部活: 
+- 特別支援: 
+
+## 👨‍👩‍👧 保護者の評判
+（口コミ情報があれば記載）
+
+## 🏠 子育て環境
+- 学童: 
+- 習い事・塾: 
+
+## 💡 この学校を検討中の保護者へ
+（2-3文のアドバイス）
+
+## 🔗 参考にしたURL
+（検索で見つかった重要なURLを箇条書き）
+
+---
+※この分析は{datetime.now().strftime('%Y年%m月%d日')}時点のGoogle検索結果に基づく参考情報です。
+"""
+    return prompt
+
+
+def analyze(model, school_name: str, prefecture: str, search_results: list) -> str:
+    """Geminiで分析して全文を返す（失敗時は例外）"""
+    response = model.generate_content(build_analysis_prompt(school_name, prefecture, search_results))
+    return response.text
+
+
+def compress_text(text: str) -> str:
+    """gzip + base64（ai_result_gz 列用）"""
+    return base64.b64encode(gzip.compress(text.encode("utf-8"), mtime=0)).decode("ascii")
+
+
+def decompress_text(data: str) -> str:
+    return gzip.decompress(base64.b64decode(data)).decode("utf-8")
+
+
+def compact_search_results(results: list, limit: int = MAX_DISPLAYED_RESULTS) -> list:
+    """表示する件数だけ title / link / snippet を残す（search_results_json 列用）"""
+    return [{"title": r.get("title", ""), "link": r.get("link", ""), "snippet": r.get("snippet", "")}
+            for r in results[:limit]]
+
+
+def build_cache_record(school_name: str, prefecture: str, search_key: str, ai_result: str, search_results: list) -> dict:
+    """school_risk_cacheに保存するレコード（分析結果は圧縮、検索結果は構造化して保存）"""
+    return {
+        "school_name": school_name,
+        "prefecture": prefecture,
+        "search_key": search_key,
+        "ai_result_gz": compress_text(ai_result),
+        "search_results_json": compact_search_results(search_results),
+        # 旧形式の列は空にする（移行前の行を上書きした場合に重複して持たないため）
+        "ai_result": None,
+        "search_results": None,
+        "updated_at": datetime.now(timezone.utc).isoformat()
+    }
+
+
+def record_report(record: dict) -> str:
+    """キャッシュ行の分析結果（Markdown）"""
+    if record.get("ai_result_gz"):
+        return decompress_text(record["ai_result_gz"])
+    return record.get("ai_result") or ""
+
+
+def parse_legacy_search_results(search_results_html: str) -> list:
+    """旧形式のHTMLから [{title, link, snippet}] を取り出す"""
+    return [match.groupdict() for match in _LEGACY_RESULT_RE.finditer(search_results_html or '')]
+
+
+def record_search_results(record: dict) -> list:
+    """キャッシュ行の検索結果 [{title, link, snippet}]（移行前の行は保存済みのHTMLから取り出す）"""
+    if record.get("search_results_json") is not None:
+        return record["search_results_json"]
+    return parse_legacy_search_results(record.get("search_results"))
+
+
+def run_pipeline(model, school_name: str, prefecture: str, search_key: str, api_key: str, cx: str) -> dict:
+    """検索→分析→キャッシュ用レコードまでを一括で行う（検索結果が0件・分析失敗時は例外）"""
+    results, errors = google_search(build_queries(school_name), api_key, cx)
+    if not results:
+        raise RuntimeError("; ".join(errors) or "検索結果がありません")
+    ai_result = analyze(model, school_name, prefecture, results)
+    return build_cache_record(school_name, prefecture, search_key, ai_result, results)
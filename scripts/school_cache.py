@@ -0,0 +1,271 @@
+"""
+学校リスク予報キャッシュの補助モジュール
+Supabase(school_risk_cache)の手前に置くプロセス内LRU/TTLキャッシュなど
+"""
+
+import atexit
+import threading
+import time
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+# キャッシュ行の鮮度（updated_atからの経過時間で決まる）
+FRESH = "fresh"      # そのまま表示
+STALE = "stale"      # 表示しつつバックグラウンドで再分析
+EXPIRED = "expired"  # 表示せずに再分析
+
+
+def estimate_size(record: dict) -> int:
+    """レコードのおおよそのバイト数（UTF-8換算）"""
+    return sum(len(str(k).encode()) + len(str(v).encode()) for k, v in record.items())
+
+
+class LRUCache:
+    """件数とバイト数の上限を持つスレッドセーフなLRU/TTLキャッシュ"""
+
+    def __init__(self, max_entries: int = 256, max_bytes: int = 8 * 1024 * 1024, default_ttl: float = 600):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self._data = OrderedDict()  # key -> (value, size, expires_at)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, size, expires_at = entry
+            if expires_at <= time.monotonic():
+                self._remove(key)
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: str, value: dict, ttl: float = None):
+        ttl = self.default_ttl if ttl is None else ttl
+        size = estimate_size(value)
+        if ttl <= 0 or size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = (value, size, time.monotonic() + ttl)
+            self._bytes += size
+            while len(self._data) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._data))
+                self._remove(oldest)
+
+    def delete(self, key: str):
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+
+    def _remove(self, key: str):
+        _, size, _ = self._data.pop(key)
+        self._bytes -= size
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._data), "bytes": self._bytes, "hits": self.hits, "misses": self.misses}
+
+
+class AccessCountAggregator:
+    """search_keyごとのヒット数をメモリに貯め、バックグラウンドでまとめて書き込む（write-behind）
+
+    flush_interval秒ごと、または未書き込みのヒットがflush_threshold件に達した時点で
+    flush_fn({search_key: 加算数}) を1回だけ呼ぶ。失敗した分は次回に持ち越す。
+    """
+
+    def __init__(self, flush_fn, flush_interval: float = 30, flush_threshold: int = 50):
+        self.flush_fn = flush_fn
+        self.flush_interval = flush_interval
+        self.flush_threshold = flush_threshold
+        self._counts = Counter()
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="access-count-flusher", daemon=True)
+        self._thread.start()
+        atexit.register(self.flush)
+
+    def record(self, key: str, n: int = 1):
+        with self._lock:
+            self._counts[key] += n
+            self._pending += n
+            if self._pending >= self.flush_threshold:
+                self._wake.set()
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                if not self._counts:
+                    return
+                counts, self._counts = self._counts, Counter()
+                self._pending = 0
+            try:
+                self.flush_fn(dict(counts))
+            except Exception as e:
+                print(f"⚠️ access_count書き込み失敗（次回再試行）: {e}")
+                with self._lock:
+                    self._counts.update(counts)
+                    self._pending += sum(counts.values())
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+
+class _Flight:
+    def __init__(self):
+        self._done = threading.Event()
+        self.result = None
+        self.failed = False
+
+    def wait(self, timeout: float = None):
+        """先行処理の結果を待つ（タイムアウト・失敗時はNone）"""
+        if not self._done.wait(timeout) or self.failed:
+            return None
+        return self.result
+
+
+class SingleFlight:
+    """同じキーの処理をプロセス内で1つにまとめる（single-flight）
+
+    join()で最初に来た呼び出しがリーダーとなり処理を実行してfinish()で結果を配る。
+    後続の呼び出しはflight.wait()でリーダーの結果を待つ。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights = {}
+
+    def join(self, key: str):
+        """(flight, リーダーかどうか) を返す"""
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                return flight, False
+            flight = _Flight()
+            self._flights[key] = flight
+            return flight, True
+
+    def finish(self, key: str, flight: _Flight, result=None, failed: bool = False):
+        """リーダーが必ず呼ぶ（例外時もfailed=Trueで呼ぶこと）"""
+        with self._lock:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+        flight.result = result
+        flight.failed = failed or result is None
+        flight._done.set()
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._flights)
+
+
+class BackgroundRefresher:
+    """stale-while-revalidate用の再計算をバックグラウンドスレッドで実行する
+
+    同じキーの再計算は同時に1つだけ。終了後cooldown秒は同じキーを再投入しない
+    （失敗し続けるキーでAPIのクォータを使い切らないため）。
+    実行中がmax_pending件に達している間は新しい投入を見送る。
+    """
+
+    def __init__(self, max_workers: int = 1, cooldown: float = 600, max_pending: int = 16):
+        self.cooldown = cooldown
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="cache-refresh")
+        self._lock = threading.Lock()
+        self._pending = set()
+        self._finished_at = {}  # key -> 最後に終了した時刻
+        self.scheduled = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.skipped = 0
+
+    def submit(self, key: str, fn) -> bool:
+        """fn()をバックグラウンドで実行する（見送った場合はFalse）"""
+        now = time.monotonic()
+        with self._lock:
+            finished_at = self._finished_at.get(key)
+            if (key in self._pending or len(self._pending) >= self.max_pending
+                    or (finished_at is not None and now - finished_at < self.cooldown)):
+                self.skipped += 1
+                return False
+            self._pending.add(key)
+            self.scheduled += 1
+            if len(self._finished_at) > 1024:
+                self._finished_at = {k: t for k, t in self._finished_at.items() if now - t < self.cooldown}
+        self._executor.submit(self._run, key, fn)
+        return True
+
+    def _run(self, key: str, fn):
+        ok = False
+        try:
+            fn()
+            ok = True
+        except Exception as e:
+            print(f"⚠️ キャッシュのバックグラウンド更新に失敗（{key[:8]}）: {e}")
+        finally:
+            with self._lock:
+                self._pending.discard(key)
+                self._finished_at[key] = time.monotonic()
+                if ok:
+                    self.succeeded += 1
+                else:
+                    self.failed += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"pending": len(self._pending), "scheduled": self.scheduled,
+                    "succeeded": self.succeeded, "failed": self.failed, "skipped": self.skipped}
+
+
+def increment_access_counts(client, counts: dict):
+    """increment_school_risk_access RPCでaccess_countをまとめて加算"""
+    keys = list(counts)
+    client.rpc("increment_school_risk_access", {
+        "keys": keys,
+        "counts": [counts[k] for k in keys],
+    }).execute()
+
+
+def parse_timestamp(value) -> datetime:
+    """Supabaseのタイムスタンプ文字列をaware datetimeに変換（タイムゾーンなしはUTC扱い）"""
+    if not value:
+        return None
+    try:
+        dt = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt
+
+
+def record_age_seconds(record: dict, now: datetime = None) -> float:
+    """updated_atからの経過秒数（不明な場合はNone）"""
+    updated_at = parse_timestamp(record.get("updated_at"))
+    if updated_at is None:
+        return None
+    now = now or datetime.now(timezone.utc)
+    return max((now - updated_at).total_seconds(), 0.0)
+
+
+def freshness(record: dict, fresh_seconds: float, max_age_seconds: float, now: datetime = None) -> str:
+    """FRESH / STALE / EXPIRED を返す（updated_atが不明な行はFRESH扱い）"""
+    age = record_age_seconds(record, now)
+    if age is None or age <= fresh_seconds:
+        return FRESH
+    return STALE if age <= max_age_seconds else EXPIRED
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+記事URLの正規化とリダイレクト解決
+- トラッキング用のクエリ（utm_*, oc, fbclid など）とフラグメントを除き、スキーム・ホストを小文字にする
+- Google Newsなどのリダイレクト用URLはHEADで転送先を調べる（同時実行数は上限付き）
+- 解決結果は data/journal/url-resolutions.jsonl に追記して保存し、同じURLは二度と問い合わせない
+  （転送されずに200で返ってきたURLは、UNRESOLVED_RETRY_SECONDS が過ぎたら問い合わせ直す）
+
+使い方（保存済みレコードのURLをまとめて解決・書き換える）:
+  python scripts/url_resolver.py data/child-cases.json
+"""
+
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import http_client
+
+RESOLUTION_CACHE_FILE = os.path.join('data', 'journal', 'url-resolutions.jsonl')
+MAX_RESOLVE_WORKERS = 8
+RESOLVE_TIMEOUT = 10
+UNRESOLVED_RETRY_SECONDS = 7 * 86400  # 転送されなかったURLを再確認するまでの間隔
+
+# 転送専用のホスト（これ以外のURLは正規化だけでネットワークには出ない）
+REDIRECT_HOSTS = {"news.google.com", "feedproxy.google.com", "t.co", "bit.ly", "goo.gl", "ow.ly", "buff.ly"}
+# 既知のトラッキング用キーだけを除く（「ref」のような汎用的な名前はページの内容を決めることがあるので残す）
+TRACKING_PARAMS = {"oc", "fbclid", "gclid", "yclid", "ref_src", "cmpid", "ncid", "mc_cid", "mc_eid", "_ga"}
+_DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+def canonicalize_url(url: str) -> str:
+    """同じ記事を指すURLが同じ文字列になるように整える"""
+    url = (url or '').strip()
+    try:
+        parts = urlsplit(url)
+        port = parts.port
+    except ValueError:
+        return url
+    if parts.scheme not in _DEFAULT_PORTS or not parts.hostname:
+        return url
+
+    netloc = parts.hostname.lower()
+    if port and port != _DEFAULT_PORTS[parts.scheme]:
+        netloc = f"{netloc}:{port}"
+    query = [(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+             if k.lower() not in TRACKING_PARAMS and not k.lower().startswith("utm_")]
+    return urlunsplit((parts.scheme.lower(), netloc, parts.path or '/', urlencode(query), ''))
+
+
+def needs_resolution(url: str) -> bool:
+    return (urlsplit(url).hostname or '').lower() in REDIRECT_HOSTS
+
+
+def _follow_redirects(url: str) -> str:
+    """転送先の最終URLを返す（HEADを受け付けないサーバーにはGETで本文を読まずに確認）"""
+    response = http_client.head(url, timeout=RESOLVE_TIMEOUT, allow_redirects=True)
+    if response.status_code in (403, 405):
+        response = http_client.get(url, timeout=RESOLVE_TIMEOUT, allow_redirects=True, stream=True)
+        response.close()
+    response.raise_for_status()
+    return response.url
+
+
+class UrlResolver:
+    """URL -> 正規化済みの転送先URL の永続キャッシュ付きリゾルバ"""
+
+    def __init__(self, cache_path: str = RESOLUTION_CACHE_FILE):
+        self.cache_path = cache_path
+        self._cache = {}
+        self._unresolved = {}  # 転送されなかったURL -> 確認した時刻（UNIX秒）
+        self.resolved_count = 0
+        self.unresolved_count = 0
+        self.failed_count = 0
+        if os.path.exists(cache_path):
+            with open(cache_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    if line.endswith('\n') and line.strip():
+                        self._load_entry(json.loads(line))
+
+    def _load_entry(self, entry: dict):
+        url, resolved = entry['url'], entry['resolved']
+        if needs_resolution(resolved):
+            # 転送先が分からなかった記録（checked_atのない古い記録はすぐに再確認する）
+            self._cache.pop(url, None)
+            self._unresolved[url] = entry.get('checked_at', 0)
+        else:
+            self._unresolved.pop(url, None)
+            self._cache[url] = resolved
+
+    def _should_retry(self, url: str, now: float) -> bool:
+        return now - self._unresolved.get(url, 0) >= UNRESOLVED_RETRY_SECONDS
+
+    def __len__(self):
+        return len(self._cache)
+
+    def lookup(self, url: str) -> str:
+        """キャッシュだけを使って正規化済みURLを返す（未解決ならネットワークに出ずに正規化のみ）"""
+        return self._cache.get(url) or canonicalize_url(url)
+
+    def resolve_many(self, urls) -> dict:
+        """URL -> 正規化済みURL。キャッシュにない転送用URLだけを並列にHEADで解決する
+
+        ネットワーク操作はワーカースレッド、キャッシュの読み書きは呼び出し元スレッドだけで行う。
+        解決に失敗したURLは正規化のみの結果を返し、キャッシュしない（次回再試行）。
+        転送されずに200で返ってきたURLは確認時刻だけを記録し、UNRESOLVED_RETRY_SECONDS 後に再確認する。
+        """
+        urls = list(dict.fromkeys(u for u in urls if u))
+        now = time.time()
+        pending = [u for u in urls
+                   if u not in self._cache and needs_resolution(u) and self._should_retry(u, now)]
+        resolved = {}
+        if pending:
+            with ThreadPoolExecutor(max_workers=min(MAX_RESOLVE_WORKERS, len(pending))) as executor:
+                futures = {u: executor.submit(_follow_redirects, u) for u in pending}
+            new_entries = []
+            for url, future in futures.items():
+                try:
+                    final_url = canonicalize_url(future.result())
+                except Exception as e:
+                    self.failed_count += 1
+                    print(f"  ⚠️ URL解決に失敗: {url[:60]}... ({e})")
+                    continue
+                if needs_resolution(final_url):
+                    new_entries.append({"url": url, "resolved": final_url, "checked_at": int(now)})
+                    self.unresolved_count += 1
+                else:
+                    resolved[url] = final_url
+                    new_entries.append({"url": url, "resolved": final_url})
+                    self.resolved_count += 1
+            self._append(new_entries)
+        return {u: resolved.get(u) or self.lookup(u) for u in urls}
+
+    def _append(self, entries):
+        if not entries:
+            return
+        for entry in entries:
+            self._load_entry(entry)
+        os.makedirs(os.path.dirname(self.cache_path) or '.', exist_ok=True)
+        with open(self.cache_path, 'a', encoding='utf-8') as f:
+            f.writelines(json.dumps(e, ensure_ascii=False) + '\n' for e in entries)
+
+
+def resolve_archive(published_path: str):
+    """保存済みレコードのurl・sourcesのURLを解決し、変わったレコードだけを追記して書き出す"""
+    from jsonl_store import JsonlStore
+    from publish_shards import CHILD_CASES_FILE, publish_shards
+
+    store = JsonlStore(published_path)
+    records = list(store.iter_records())
+    resolver = UrlResolver()
+    urls = [r.get('url', '') for r in records] + [s.get('url', '') for r in records for s in r.get('sources', [])]
+    mapping = resolver.resolve_many(urls)
+
+    updated = []
+    for record in records:
+        changed = False
+        if record.get('url') and mapping[record['url']] != record['url']:
+            record['url'] = mapping[record['url']]
+            changed = True
+        for source in record.get('sources', []):
+            if source.get('url') and mapping[source['url']] != source['url']:
+                source['url'] = mapping[source['url']]
+                changed = True
+        if changed:
+            updated.append(record)
+
+    print(f"🔗 {len(records)}件中 {len(updated)}件のURLを更新（新規解決 {resolver.resolved_count}件 / 転送なし {resolver.unresolved_count}件 / 失敗 {resolver.failed_count}件）")
+    if updated:
+        store.append(updated)
+        store.compact()
+        if os.path.abspath(published_path) == os.path.abspath(CHILD_CASES_FILE):
+            publish_shards(published_path)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 2:
+        print("使い方: python scripts/url_resolver.py data/<名前>.json")
+        sys.exit(1)
+    resolve_archive(sys.argv[1])
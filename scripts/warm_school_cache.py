@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+school_risk_cache の事前生成（キャッシュ温め）ジョブ
+よく見られていて古くなった行から順に、検索＋AI分析をやり直して上書きする。
+ユーザーの検索時にGoogle検索3回とGemini生成を待たせないため。
+
+- 対象: updated_at が --min-age-days より古い行を access_count の多い順（同数は古い順）
+- 件数は --limit と、Google検索・Geminiの呼び出し予算（1校あたり検索3回＋生成1回）で決まる
+- 並列数は --workers で制限する
+- access_count は送らないので、upsertしても既存の値が保たれる
+
+使い方:
+  SUPABASE_URL=... SUPABASE_KEY=... GOOGLE_API_KEY=... GOOGLE_CX=... GEMINI_API_KEY=... \\
+    python scripts/warm_school_cache.py --limit 20 --dry-run
+"""
+
+import argparse
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta, timezone
+
+import google.generativeai as genai
+from supabase import create_client
+
+import cache_keys
+import gemini_models
+import http_client
+import school_analysis
+
+TABLE = "school_risk_cache"
+REQUIRED_ENV = ("SUPABASE_URL", "SUPABASE_KEY", "GOOGLE_API_KEY", "GOOGLE_CX", "GEMINI_API_KEY")
+QUERIES_PER_SCHOOL = len(school_analysis.SEARCH_QUERY_TEMPLATES)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="school_risk_cache の人気・古い行を再分析して上書きする")
+    parser.add_argument("--limit", type=int, default=20, help="再分析する最大校数")
+    parser.add_argument("--min-age-days", type=float, default=7, help="これより新しい行は対象外")
+    parser.add_argument("--google-query-budget", type=int, default=60, help="Google検索の呼び出し上限")
+    parser.add_argument("--gemini-budget", type=int, default=20, help="Gemini生成の呼び出し上限")
+    parser.add_argument("--workers", type=int, default=2, help="同時に再分析する校数")
+    parser.add_argument("--dry-run", action="store_true", help="対象を表示するだけで検索・分析しない")
+    return parser.parse_args(argv)
+
+
+def school_quota(limit: int, google_query_budget: int, gemini_budget: int) -> int:
+    """件数上限と各APIの予算から、今回再分析できる校数を決める"""
+    return max(0, min(limit, google_query_budget // QUERIES_PER_SCHOOL, gemini_budget))
+
+
+def fetch_targets(client, count: int, min_age_days: float) -> list:
+    """access_countの多い順・updated_atの古い順に、古くなった行を取り出す"""
+    if count <= 0:
+        return []
+    cutoff = (datetime.now(timezone.utc) - timedelta(days=min_age_days)).isoformat()
+    response = (client.table(TABLE)
+                .select("search_key, school_name, prefecture, access_count, updated_at")
+                .lt("updated_at", cutoff)
+                .order("access_count", desc=True)
+                .order("updated_at")
+                .limit(count)
+                .execute())
+    return response.data or []
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    missing = [name for name in REQUIRED_ENV if not os.environ.get(name)]
+    if missing:
+        print(f"ℹ️ {', '.join(missing)} が未設定のためスキップします")
+        return
+
+    client = create_client(os.environ["SUPABASE_URL"], os.environ["SUPABASE_KEY"])
+    quota = school_quota(args.limit, args.google_query_budget, args.gemini_budget)
+    targets = fetch_targets(client, quota, args.min_age_days)
+    print(f"🔥 キャッシュ温め: 対象 {len(targets)}校（上限 {quota}校 / {args.min_age_days:g}日より古い行）")
+    for row in targets:
+        print(f"  📋 {row['school_name']}（{row.get('prefecture') or '-'}） "
+              f"アクセス {row.get('access_count') or 0} / 更新 {(row.get('updated_at') or '-')[:10]}")
+    if args.dry_run or not targets:
+        if args.dry_run:
+            print("ℹ️ --dry-run のため再分析していません")
+        return
+
+    genai.configure(api_key=os.environ["GEMINI_API_KEY"])
+    model_name = gemini_models.select_model_name(school_analysis.PREFERRED_GEMINI_MODELS)
+    if not model_name:
+        print("❌ 利用可能なGeminiモデルがありません")
+        sys.exit(1)
+    model = genai.GenerativeModel(model_name)
+    print(f"✅ 使用モデル: {model_name}")
+
+    api_key, cx = os.environ["GOOGLE_API_KEY"], os.environ["GOOGLE_CX"]
+    refreshed = failed = 0
+    with ThreadPoolExecutor(max_workers=max(1, args.workers)) as executor:
+        futures = {
+            executor.submit(school_analysis.run_pipeline, model, row["school_name"],
+                            row.get("prefecture") or cache_keys.NO_PREFECTURE, row["search_key"], api_key, cx): row
+            for row in targets
+        }
+        for future in as_completed(futures):
+            row = futures[future]
+            try:
+                record = future.result()
+                client.table(TABLE).upsert(record, on_conflict="search_key").execute()
+                refreshed += 1
+                print(f"  ✅ {row['school_name']}")
+            except Exception as e:
+                failed += 1
+                print(f"  ⚠️ {row['school_name']}: {e}")
+
+    print(f"📊 更新 {refreshed}校 / 失敗 {failed}校"
+          f"（Google検索 最大{len(targets) * QUERIES_PER_SCHOOL}回 / Gemini {len(targets)}回）")
+    print(f"🔌 {http_client.format_stats()}")
+    if targets and not refreshed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
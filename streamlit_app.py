@@ -4,12 +4,23 @@ Gemini AI + Google Custom Search でリアルタイム検索・分析
 子ども事件DB連携 + Supabaseキャッシュ + レート制限
 """
 
+import os
+import sys
 import streamlit as st
 import google.generativeai as genai
-import requests
 import urllib.parse
-import hashlib
-from datetime import datetime, timedelta
+import time
+
+# scripts/ の共有モジュールを読み込めるようにする
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "scripts"))
+import cache_keys
+import case_index
+import gazetteer
+import data_snapshot
+import publish_shards
+import gemini_models
+import school_analysis
+import school_cache
 
 # ページ設定
 st.set_page_config(
@@ -31,48 +42,29 @@ def increment_search_count():
     st.session_state.search_count += 1
 
 # --- Google Custom Search API ---
-def google_search(query: str, num_results: int = 5) -> list:
-    """Google Custom Search APIで検索"""
-    try:
-        api_key = st.secrets.get("GOOGLE_API_KEY", "")
-        cx = st.secrets.get("GOOGLE_CX", "")
-        
-        if not api_key:
-            st.error("❌ GOOGLE_API_KEY が設定されていません")
-            return []
-        if not cx:
-            st.error("❌ GOOGLE_CX が設定されていません")
-            return []
-        
-        url = "https://www.googleapis.com/customsearch/v1"
-        params = {
-            "key": api_key,
-            "cx": cx,
-            "q": query,
-            "num": num_results,
-            "lr": "lang_ja"
-        }
-        
-        response = requests.get(url, params=params, timeout=10)
-        
-        if response.status_code != 200:
-            error_data = response.json()
-            error_msg = error_data.get("error", {}).get("message", "Unknown error")
-            st.error(f"❌ Google API エラー: {error_msg}")
-            return []
-        
-        data = response.json()
-        results = []
-        for item in data.get("items", []):
-            results.append({
-                "title": item.get("title", ""),
-                "link": item.get("link", ""),
-                "snippet": item.get("snippet", "")
-            })
-        return results
-    except Exception as e:
-        st.error(f"❌ 検索エラー: {str(e)}")
-    return []
+SEARCH_DEADLINE_SECONDS = school_analysis.SEARCH_DEADLINE_SECONDS  # 並列検索全体の締め切り
+
+def google_search(queries: list, deadline: float = SEARCH_DEADLINE_SECONDS) -> list:
+    """複数クエリを並列にGoogle検索し、クエリ順・link重複なしでマージ（scripts/school_analysis.py）
+    
+    一部のクエリが失敗・締め切り超過しても、取得できた分だけ返す。
+    """
+    api_key = st.secrets.get("GOOGLE_API_KEY", "")
+    cx = st.secrets.get("GOOGLE_CX", "")
+    
+    if not api_key:
+        st.error("❌ GOOGLE_API_KEY が設定されていません")
+        return []
+    if not cx:
+        st.error("❌ GOOGLE_CX が設定されていません")
+        return []
+    
+    all_results, errors = school_analysis.google_search(queries, api_key, cx, deadline=deadline)
+    
+    # 同じエラーはまとめて1回だけ表示
+    for msg in errors:
+        st.error(f"❌ 検索エラー: {msg}")
+    return all_results
 
 # Supabase読み込み
 try:
@@ -95,106 +87,238 @@ except:
     pass
 
 # キャッシュ関数
-def generate_cache_key(school_name: str, prefecture: str) -> str:
-    raw = f"{school_name}_{prefecture}".lower().strip()
-    return hashlib.md5(raw.encode()).hexdigest()
+# キーは表記ゆれを正規化してから生成する（scripts/cache_keys.py）
+generate_cache_key = cache_keys.generate_cache_key
+
+# 1段目: プロセス内メモリ / 2段目: Supabase
+MEMORY_CACHE_MAX_ENTRIES = 256
+MEMORY_CACHE_MAX_BYTES = 8 * 1024 * 1024  # 8MB
+MEMORY_CACHE_TTL = 600  # 他プロセスの更新を拾うため10分でメモリから落とす
 
-def get_from_cache(search_key: str):
+try:
+    CACHE_FRESH_DAYS = float(st.secrets.get("CACHE_FRESH_DAYS", 7))
+except Exception:
+    CACHE_FRESH_DAYS = 7
+CACHE_FRESH_SECONDS = CACHE_FRESH_DAYS * 86400  # これを過ぎた行は表示しつつバックグラウンドで再分析
+
+try:
+    CACHE_MAX_AGE_DAYS = float(st.secrets.get("CACHE_MAX_AGE_DAYS", 30))
+except Exception:
+    CACHE_MAX_AGE_DAYS = 30
+CACHE_MAX_AGE_SECONDS = CACHE_MAX_AGE_DAYS * 86400  # updated_atからこの期間を過ぎたら表示せずに再分析
+
+# staleな行のバックグラウンド再分析
+CACHE_REFRESH_WORKERS = 1
+CACHE_REFRESH_COOLDOWN_SECONDS = 600  # 同じ学校の再分析は10分に1回まで
+
+# access_countはヒットごとに書かず、まとめて加算する
+ACCESS_COUNT_FLUSH_SECONDS = 30
+ACCESS_COUNT_FLUSH_HITS = 50
+
+@st.cache_resource
+def get_memory_cache() -> school_cache.LRUCache:
+    return school_cache.LRUCache(
+        max_entries=MEMORY_CACHE_MAX_ENTRIES,
+        max_bytes=MEMORY_CACHE_MAX_BYTES,
+        default_ttl=MEMORY_CACHE_TTL,
+    )
+
+@st.cache_resource
+def get_access_counter():
+    """access_countのwrite-behind集計（Supabase未設定時はNone）"""
     if not cache_enabled or not supabase:
         return None
-    try:
-        response = supabase.table("school_risk_cache").select("*").eq("search_key", search_key).execute()
-        if response.data and len(response.data) > 0:
-            record = response.data[0]
-            # アクセス回数更新
-            supabase.table("school_risk_cache").update({
-                "access_count": record.get("access_count", 0) + 1,
-            }).eq("id", record["id"]).execute()
-            return record
-    except:
-        pass
-    return None
-
-def save_to_cache(school_name: str, prefecture: str, search_key: str, ai_result: str, search_results: str):
-    if not cache_enabled or not supabase:
-        return
-    try:
-        supabase.table("school_risk_cache").upsert({
-            "school_name": school_name,
-            "prefecture": prefecture,
-            "search_key": search_key,
-            "ai_result": ai_result,
-            "search_results": search_results,
-            "updated_at": datetime.now().isoformat()
-        }).execute()
-    except:
-        pass
+    return school_cache.AccessCountAggregator(
+        lambda counts: school_cache.increment_access_counts(supabase, counts),
+        flush_interval=ACCESS_COUNT_FLUSH_SECONDS,
+        flush_threshold=ACCESS_COUNT_FLUSH_HITS,
+    )
+
+def _record_hit(search_key: str):
+    counter = get_access_counter()
+    if counter is not None:
+        counter.record(search_key)
+
+@st.cache_resource
+def get_refresher() -> school_cache.BackgroundRefresher:
+    return school_cache.BackgroundRefresher(
+        max_workers=CACHE_REFRESH_WORKERS,
+        cooldown=CACHE_REFRESH_COOLDOWN_SECONDS,
+    )
+
+def _remember(search_key: str, record: dict, memory_cache: school_cache.LRUCache = None):
+    """メモリキャッシュに保存（staleness期限を超えて残らないようTTLを調整）"""
+    ttl = MEMORY_CACHE_TTL
+    age = school_cache.record_age_seconds(record)
+    if age is not None:
+        ttl = min(ttl, CACHE_MAX_AGE_SECONDS - age)
+    (memory_cache or get_memory_cache()).set(search_key, record, ttl=ttl)
+
+def _persist(record: dict, memory_cache: school_cache.LRUCache = None):
+    """メモリとSupabaseに保存（st.*を呼ばないので、バックグラウンド更新からも使える）"""
+    _remember(record["search_key"], record, memory_cache)
+    if cache_enabled and supabase:
+        try:
+            supabase.table("school_risk_cache").upsert(record, on_conflict="search_key").execute()
+        except:
+            pass
+
+def schedule_refresh(search_key: str, record: dict) -> bool:
+    """staleな行の再分析をバックグラウンドに投入する（APIキー未設定なら何もしない）
+    
+    キャッシュヒットの応答を遅らせないよう、ここでは設定の有無だけを確認し、
+    Geminiモデルの選択（list_models）はバックグラウンドで行う。
+    """
+    gemini_api_key = GEMINI_API_KEY
+    api_key = st.secrets.get("GOOGLE_API_KEY", "")
+    cx = st.secrets.get("GOOGLE_CX", "")
+    if not gemini_api_key or not api_key or not cx:
+        return False
+    
+    memory_cache = get_memory_cache()
+    school_name = record.get("school_name", "")
+    prefecture = record.get("prefecture") or cache_keys.NO_PREFECTURE
+    
+    def refresh():
+        # 別スレッドで実行するため、st.* は呼ばずに必要なものは事前に取り出しておく
+        model = _build_gemini_model(gemini_api_key)
+        _persist(school_analysis.run_pipeline(model, school_name, prefecture, search_key, api_key, cx), memory_cache)
+    
+    return get_refresher().submit(search_key, refresh)
+
+def get_from_cache(search_key: str) -> tuple:
+    """(レコード, 鮮度) を返す
+    
+    fresh・staleはそのまま返し、staleはバックグラウンドでの再分析を予約する。
+    expired・未登録の場合のレコードはNone（呼び出し側で再分析する）。
+    """
+    record = get_memory_cache().get(search_key)
+    from_memory = record is not None
+    if record is None and cache_enabled and supabase:
+        try:
+            response = supabase.table("school_risk_cache").select(school_analysis.CACHE_COLUMNS).eq("search_key", search_key).execute()
+            if response.data and len(response.data) > 0:
+                record = response.data[0]
+        except:
+            pass
+    if record is None:
+        return None, None
+    
+    state = school_cache.freshness(record, CACHE_FRESH_SECONDS, CACHE_MAX_AGE_SECONDS)
+    if state == school_cache.EXPIRED:
+        return None, state
+    if not from_memory:
+        _remember(search_key, record)
+    _record_hit(search_key)
+    if state == school_cache.STALE:
+        schedule_refresh(search_key, record)
+    return record, state
+
+def save_to_cache(school_name: str, prefecture: str, search_key: str, ai_result: str, search_results: list):
+    record = school_analysis.build_cache_record(school_name, prefecture, search_key, ai_result, search_results)
+    _persist(record)
+    return record
 
 # 子ども事件データ
-@st.cache_data(ttl=3600)
-def load_child_cases():
-    try:
-        url = "https://tabekirimaru-glitch.github.io/meiyaku-knights/data/child-cases.json"
-        response = requests.get(url, timeout=10)
-        if response.status_code == 200:
-            return response.json()
-    except:
-        pass
-    return []
-
-def find_related_cases(cases: list, search_term: str, prefecture: str, limit: int = 5):
-    results = []
-    search_keywords = []
-    if prefecture != "指定なし":
-        search_keywords.append(prefecture.replace("県", "").replace("府", "").replace("都", ""))
+DATA_BASE_URL = "https://tabekirimaru-glitch.github.io/meiyaku-knights/data"
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+CHILD_CASES_URL = f"{DATA_BASE_URL}/child-cases.json"
+CHILD_CASES_BUNDLED = os.path.join(DATA_DIR, "child-cases.json")
+CHILD_CASES_STATS_URL = f"{DATA_BASE_URL}/child-cases-stats.json"
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def load_child_cases_snapshot() -> tuple[list, dict]:
+    """ETag/Last-Modifiedで再検証し、オフライン時はスナップショット→同梱データの順に使う"""
+    return data_snapshot.load_json(CHILD_CASES_URL, "child-cases", fallback_path=CHILD_CASES_BUNDLED)
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def load_case_shard(code: str) -> tuple[list, dict]:
+    """都道府県別シャード（scripts/publish_shards.py が出力）を読み込む"""
+    rel_path = f"child-cases/by-prefecture/{code}.json"
+    return data_snapshot.load_json(f"{DATA_BASE_URL}/{rel_path}", f"child-cases-{code}",
+                                   fallback_path=os.path.join(DATA_DIR, rel_path))
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def load_case_stats() -> dict:
+    """都道府県・タグ別の件数（scripts/publish_stats.py が出力する数KBの集計）"""
+    stats, _ = data_snapshot.load_json(CHILD_CASES_STATS_URL, "child-cases-stats",
+                                       fallback_path=os.path.join(DATA_DIR, "child-cases-stats.json"))
+    return stats if isinstance(stats, dict) else {}
+
+def _older_meta(a: dict, b: dict) -> dict:
+    """2つのデータのうち、古い（またはオフラインの）方のメタ情報"""
+    offline = ("snapshot", "bundled", "none")
+    if (a["source"] in offline) != (b["source"] in offline):
+        return a if a["source"] in offline else b
+    return min(a, b, key=lambda m: m["fetched_at"] or 0)
+
+@st.cache_resource(ttl=3600, show_spinner=False)
+def get_case_index(prefecture: str) -> tuple[case_index.CaseIndex, dict]:
+    """都道府県指定時はその県と所在地不明のシャードだけ、指定なしは全件でインデックスを作る
+    
+    所在地不明（00）のシャードが全体の8割以上を占めるため、都道府県指定でも読み込み量はあまり減らない。
+    """
+    code = publish_shards.prefecture_code(prefecture)
+    if code == publish_shards.UNKNOWN_PREFECTURE:
+        cases, meta = load_child_cases_snapshot()
+    else:
+        cases, meta = load_case_shard(code)
+        unknown_cases, unknown_meta = load_case_shard(publish_shards.UNKNOWN_PREFECTURE)
+        cases = cases + unknown_cases
+        meta = _older_meta(meta, unknown_meta)
+    return case_index.CaseIndex(cases), meta
+
+def find_related_cases(index: case_index.CaseIndex, search_term: str, prefecture: str, limit: int = 5):
+    # 所在地は地名辞書でコードにして、収集時に付けたコードと一致した事件を加点する
+    prefecture_code = publish_shards.prefecture_code(prefecture)
+    if prefecture_code == publish_shards.UNKNOWN_PREFECTURE:
+        prefecture_code = ""
+    prefecture_code, city_code = gazetteer.default_gazetteer().locate(search_term, prefecture_code)
     
+    # 具体的なキーワードほど先に並べる（学校名 > 市区町村 > 都道府県）
+    search_keywords = [search_term]
+    
+    # 所在地コードが付いていない事件も多いので、コードが分かっても本文中の地名で探す
     for keyword in ["市", "区", "町", "村"]:
         if keyword in search_term:
             idx = search_term.find(keyword)
             if idx > 0:
                 search_keywords.append(search_term[:idx])
                 break
+    if prefecture_code:
+        search_keywords.append(cache_keys.short_prefecture(gazetteer.prefecture_name(prefecture_code)))
     
-    search_keywords.append(search_term)
-    
-    for case in cases:
-        title = case.get("title", "")
-        for keyword in search_keywords:
-            if keyword and len(keyword) >= 2 and keyword in title:
-                results.append(case)
-                break
-        if len(results) >= limit:
-            break
-    return results
+    return index.search(search_keywords, limit=limit, prefecture_code=prefecture_code, city_code=city_code)
 
 # --- Gemini API設定 ---
-model = None
-api_available = False
+# モデル一覧の取得は分析が必要になった時点まで遅延する
+PREFERRED_GEMINI_MODELS = school_analysis.PREFERRED_GEMINI_MODELS
 
 try:
     GEMINI_API_KEY = st.secrets["GEMINI_API_KEY"]
-    genai.configure(api_key=GEMINI_API_KEY)
-    
-    available = []
-    for m in genai.list_models():
-        if 'generateContent' in m.supported_generation_methods:
-            available.append(m.name)
-    
-    preferred = ['models/gemini-1.5-flash', 'models/gemini-1.5-pro', 'models/gemini-pro']
-    selected = None
-    for p in preferred:
-        if p in available:
-            selected = p
-            break
-    
-    if not selected and available:
-        selected = available[0]
-    
-    if selected:
-        model = genai.GenerativeModel(selected)
-        api_available = True
 except:
-    pass
+    GEMINI_API_KEY = ""
+
+def _build_gemini_model(api_key: str):
+    """Geminiモデルを作る（st.*を呼ばないので、バックグラウンド更新からも使える）"""
+    genai.configure(api_key=api_key)
+    selected = gemini_models.select_model_name(PREFERRED_GEMINI_MODELS)
+    if not selected:
+        raise RuntimeError("利用可能なGeminiモデルがありません")  # 例外はキャッシュされない
+    return genai.GenerativeModel(selected)
+
+@st.cache_resource(ttl=gemini_models.MODEL_CACHE_TTL, show_spinner=False)
+def _load_gemini_model(api_key: str):
+    return _build_gemini_model(api_key)
+
+def get_gemini_model():
+    """Geminiモデルを返す（未設定・取得失敗時はNone）"""
+    if not GEMINI_API_KEY:
+        return None
+    try:
+        return _load_gemini_model(GEMINI_API_KEY)
+    except Exception:
+        return None
 
 # カスタムCSS（ダークモード対応）
 st.markdown("""
@@ -226,105 +350,50 @@ with col2:
 
 prefecture = st.selectbox(
     "都道府県（オプション）",
-    ["指定なし"] + [
-        "北海道", "青森県", "岩手県", "宮城県", "秋田県", "山形県", "福島県",
-        "茨城県", "栃木県", "群馬県", "埼玉県", "千葉県", "東京都", "神奈川県",
-        "新潟県", "富山県", "石川県", "福井県", "山梨県", "長野県", "岐阜県",
-        "静岡県", "愛知県", "三重県", "滋賀県", "京都府", "大阪府", "兵庫県",
-        "奈良県", "和歌山県", "鳥取県", "島根県", "岡山県", "広島県", "山口県",
-        "徳島県", "香川県", "愛媛県", "高知県", "福岡県", "佐賀県", "長崎県",
-        "熊本県", "大分県", "宮崎県", "鹿児島県", "沖縄県"
-    ],
+    [cache_keys.NO_PREFECTURE] + cache_keys.PREFECTURES,
     label_visibility="collapsed"
 )
 
 st.divider()
 
-# AI分析関数
-def analyze_with_search_results(school_name: str, prefecture: str, search_results: list) -> str:
-    """Google検索結果を元にGeminiで分析"""
-    location = f"{prefecture}の" if prefecture != "指定なし" else ""
-    
-    # 検索結果をテキスト化
-    search_text = ""
-    for i, r in enumerate(search_results, 1):
-        search_text += f"{i}. {r['title']}\n   URL: {r['link']}\n   概要: {r['snippet']}\n\n"
-    
-    if not search_text:
-        search_text = "検索結果が見つかりませんでした。"
-    
-    prompt = f"""
-あなたは学校の安全性と教育環境を分析する専門家AIです。
-以下のGoogle検索結果を元に、{location}{school_name}の詳細分析を行ってください。
-
-【Google検索結果】
-{search_text}
-
-【分析項目】親の視点で以下を詳しく分析してください：
-
-1. **安全性・事件情報**
-   - 過去の事件・事故・いじめ報道
-   - 学校の対応姿勢（隠蔽傾向 or 透明性）
-
-2. **地域の治安**
-   - 不審者情報の有無
-   - 通学路の安全性
-   - 周辺の犯罪発生状況
-
-3. **教育環境**
-   - 学力水準・進学実績（情報があれば）
-   - 部活動の充実度
-   - 特別支援・発達障害への対応
-
-4. **保護者の評判**
-   - 口コミサイトでの評価
-   - 先生の評判
-   - PTA活動の負担感
-
-5. **子育て環境**
-   - 学童保育の状況
-   - 周辺の習い事・塾
-   - 地域コミュニティの活発さ
-
-【出力形式】
-## 🎯 総合評価
-[安心/注意必要/要警戒/情報不足] と理由を1-2文で
-
-## 🚨 安全性・事件情報
-（発見された記事はURLを含めて記載。なければ「重大な事件報道は見つかりませんでした」）
+# AI分析関数（プロンプトは scripts/school_analysis.py）
+build_analysis_prompt = school_analysis.build_analysis_prompt
 
-## 🏘️ 地域の治安
-- 不審者情報: 
-- 通学路: 
-- 周辺治安: 
-
-## 📚 教育環境
-- 学力: 
-- 部活: 
-- 特別支援: 
-
-## 👨‍👩‍👧 保護者の評判
-（口コミ情報があれば記載）
-
-## 🏠 子育て環境
-- 学童: 
-- 習い事・塾: 
-
-## 💡 この学校を検討中の保護者へ
-（2-3文のアドバイス）
-
-## 🔗 参考にしたURL
-（検索で見つかった重要なURLを箇条書き）
-
----
-※この分析は{datetime.now().strftime('%Y年%m月%d日')}時点のGoogle検索結果に基づく参考情報です。
-"""
+def stream_analysis_with_search_results(school_name: str, prefecture: str, search_results: list, placeholder) -> tuple[str, dict]:
+    """Geminiの出力をストリーミングで受け取り、完成したセクション（## 見出し単位）から順にplaceholderへ表示
+    
+    戻り値: (全文, {"ttft": 最初のトークンまでの秒数, "total": 全体の秒数, "error": 失敗したか})
+    """
+    prompt = build_analysis_prompt(school_name, prefecture, search_results)
+    started = time.perf_counter()
+    ttft = None
+    text = ""
+    rendered_upto = 0
+    error = False
     
     try:
-        response = model.generate_content(prompt)
-        return response.text
+        for chunk in get_gemini_model().generate_content(prompt, stream=True):
+            try:
+                piece = chunk.text
+            except ValueError:
+                continue  # テキストを含まないチャンク（安全性フィルタ等）
+            if not piece:
+                continue
+            if ttft is None:
+                ttft = time.perf_counter() - started
+            text += piece
+            # 次の見出しが届いた = 直前のセクションが完成
+            boundary = text.rfind("\n## ")
+            if boundary > rendered_upto:
+                rendered_upto = boundary
+                placeholder.markdown(text[:boundary])
     except Exception as e:
-        return f"⚠️ 分析中にエラーが発生しました: {str(e)}"
+        error = True
+        text += f"\n\n⚠️ 分析中にエラーが発生しました: {str(e)}"
+    
+    placeholder.markdown(text)
+    total = time.perf_counter() - started
+    return text, {"ttft": ttft if ttft is not None else total, "total": total, "error": error}
 
 def demo_analysis(school_name: str) -> str:
     return f"""
@@ -374,6 +443,71 @@ def validate_school_name(name: str) -> tuple[bool, str]:
     
     return True, ""
 
+# --- 検索結果の表示・分析実行 ---
+SINGLE_FLIGHT_WAIT_SECONDS = 90  # 同じ学校の先行分析を待つ上限
+
+@st.cache_resource
+def get_single_flight() -> school_cache.SingleFlight:
+    """同じsearch_keyの分析をプロセス内で1つにまとめる"""
+    return school_cache.SingleFlight()
+
+def render_cached_result(school_name: str, record: dict, badge: str):
+    st.success(f"「{school_name}」の分析結果を表示")
+    st.markdown(f'<span class="cache-badge">{badge}</span>', unsafe_allow_html=True)
+    
+    # 保存された検索結果を表示（HTMLは表示時にエスケープして組み立てる）
+    search_results = school_analysis.record_search_results(record)
+    if search_results:
+        st.subheader("🔍 Google検索結果")
+        st.markdown(school_analysis.render_search_results_html(search_results), unsafe_allow_html=True)
+    elif record.get("search_results"):
+        # 解析できない旧形式のHTMLはエスケープされていないので、HTMLとしては表示しない
+        st.subheader("🔍 Google検索結果")
+        st.markdown(record["search_results"])
+    
+    # AI分析結果を表示
+    st.divider()
+    st.subheader("📊 AI分析結果")
+    st.markdown(school_analysis.record_report(record))
+
+def run_analysis(school_name: str, prefecture: str, search_key: str):
+    """Google検索 + Gemini分析を実行して表示し、キャッシュしたレコードを返す（未保存ならNone）"""
+    increment_search_count()
+    remaining = MAX_SEARCHES_PER_SESSION - st.session_state.search_count
+    record = None
+    
+    with st.spinner("🔍 多角的に情報収集中..."):
+        # 親目線の多角的なクエリで検索
+        queries = school_analysis.build_queries(school_name)
+        all_results = google_search(queries)
+    
+    # 検索結果を表示（最大8件）
+    if all_results:
+        st.subheader("🔍 Google検索結果")
+        st.markdown(school_analysis.render_search_results_html(all_results), unsafe_allow_html=True)
+    else:
+        st.info("Google検索結果が見つかりませんでした（APIキー未設定またはヒットなし）")
+    
+    # AI分析結果（生成されたセクションから順に表示）
+    st.divider()
+    st.subheader("📊 AI分析結果")
+    result_placeholder = st.empty()
+    
+    if all_results and get_gemini_model() is not None:
+        with st.spinner("🤖 AIが分析中..."):
+            result, timing = stream_analysis_with_search_results(school_name, prefecture, all_results, result_placeholder)
+        if not timing["error"]:
+            # キャッシュ保存
+            record = save_to_cache(school_name, prefecture, search_key, result, all_results)
+        st.caption(f"⏱️ 最初の応答まで {timing['ttft']:.1f}秒 / 生成完了まで {timing['total']:.1f}秒")
+    else:
+        result_placeholder.markdown(demo_analysis(school_name))
+    
+    st.success(f"「{school_name}」の分析が完了しました")
+    if remaining > 0:
+        st.caption(f"残り検索回数: {remaining}回")
+    return record
+
 # 検索実行
 if search_button and school_name:
     # 入力バリデーション
@@ -386,77 +520,43 @@ if search_button and school_name:
         search_key = generate_cache_key(school_name, prefecture)
         
         # キャッシュ確認
-        cached = get_from_cache(search_key)
+        cached, freshness = get_from_cache(search_key)
         
         if cached:
-            st.success(f"「{school_name}」の分析結果を表示")
-            st.markdown('<span class="cache-badge">⚡ キャッシュから取得</span>', unsafe_allow_html=True)
-            result = cached.get("ai_result", "")
-            
-            # 保存された検索結果を表示
-            if cached.get("search_results"):
-                st.subheader("🔍 Google検索結果")
-                st.markdown(cached.get("search_results", ""))
+            badge = "⚡ キャッシュから取得"
+            if freshness == school_cache.STALE:
+                badge += "（最新の情報に更新中）"
+            render_cached_result(school_name, cached, badge)
         else:
-            increment_search_count()
-            remaining = MAX_SEARCHES_PER_SESSION - st.session_state.search_count
-            
-            with st.spinner("🔍 多角的に情報収集中..."):
-                # 親目線の多角的なクエリで検索
-                queries = [
-                    f"{school_name} 事件 いじめ",
-                    f"{school_name} 口コミ 評判",
-                    f"{school_name} 不審者 治安"
-                ]
-                
-                all_results = []
-                seen_links = set()
-                
-                for q in queries:
-                    results = google_search(q, num_results=3)
-                    for r in results:
-                        if r["link"] not in seen_links:
-                            all_results.append(r)
-                            seen_links.add(r["link"])
+            flight, is_leader = get_single_flight().join(search_key)
+            shared = None
+            if not is_leader:
+                with st.spinner("⏳ 同じ学校の分析が他の方の検索で進行中です。完了を待っています..."):
+                    shared = flight.wait(SINGLE_FLIGHT_WAIT_SECONDS)
             
-            # 検索結果を表示
-            if all_results:
-                st.subheader("🔍 Google検索結果")
-                search_results_html = ""
-                for r in all_results[:8]:  # 最大8件表示
-                    search_results_html += f"""
-                    <div class="search-result">
-                        <a href="{r['link']}" target="_blank">{r['title']}</a>
-                        <p>{r['snippet'][:150]}...</p>
-                    </div>
-                    """
-                st.markdown(search_results_html, unsafe_allow_html=True)
+            if shared:
+                render_cached_result(school_name, shared, "⚡ 同時検索の結果を共有")
+            elif is_leader:
+                record = None
+                try:
+                    # join直前に他の分析が完了していた場合はその結果を使う
+                    record = get_memory_cache().get(search_key)
+                    if record:
+                        render_cached_result(school_name, record, "⚡ キャッシュから取得")
+                    else:
+                        record = run_analysis(school_name, prefecture, search_key)
+                finally:
+                    get_single_flight().finish(search_key, flight, record)
             else:
-                st.info("Google検索結果が見つかりませんでした（APIキー未設定またはヒットなし）")
-            
-            with st.spinner("🤖 AIが分析中..."):
-                if api_available and all_results:
-                    result = analyze_with_search_results(school_name, prefecture, all_results)
-                    # キャッシュ保存
-                    save_to_cache(school_name, prefecture, search_key, result, search_results_html if all_results else "")
-                else:
-                    result = demo_analysis(school_name)
-            
-            st.success(f"「{school_name}」の分析が完了しました")
-            if remaining > 0:
-                st.caption(f"残り検索回数: {remaining}回")
-        
-        # AI分析結果を表示
-        st.divider()
-        st.subheader("📊 AI分析結果")
-        st.markdown(result)
+                # 先行する分析が失敗・タイムアウトした場合は自分で実行
+                run_analysis(school_name, prefecture, search_key)
         
         # --- 子ども事件DB連携 ---
         st.divider()
         st.subheader("📰 子ども事件DBから")
         
-        child_cases = load_child_cases()
-        related_cases = find_related_cases(child_cases, school_name, prefecture)
+        cases_index, cases_meta = get_case_index(prefecture)
+        related_cases = find_related_cases(cases_index, school_name, prefecture)
         
         if related_cases:
             st.info(f"関連する事件が **{len(related_cases)}件** 見つかりました")
@@ -477,6 +577,18 @@ if search_button and school_name:
         else:
             st.info("この地域の関連事件は見つかりませんでした")
         
+        # 全件を読まずに集計ファイルから件数だけ表示
+        case_stats = load_case_stats()
+        prefecture_counts = {p["code"]: p["count"] for p in case_stats.get("by_prefecture", [])}
+        if case_stats and prefecture != cache_keys.NO_PREFECTURE:
+            count = prefecture_counts.get(publish_shards.prefecture_code(prefecture), 0)
+            st.caption(f"📈 事件DBの収録件数: {prefecture} {count}件 / 全国 {case_stats['total']}件")
+        
+        if cases_meta["source"] in ("snapshot", "bundled"):
+            st.caption(f"⚠️ 事件DBに接続できないため、保存済みデータ（{data_snapshot.describe_age(cases_meta['fetched_at'])}）を表示しています")
+        else:
+            st.caption(f"事件DBの確認: {data_snapshot.describe_age(cases_meta['fetched_at'])}")
+        
         # 免責事項
         st.divider()
         st.markdown("""
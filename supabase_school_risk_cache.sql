@@ -10,8 +10,10 @@ CREATE TABLE IF NOT EXISTS school_risk_cache (
     school_name TEXT NOT NULL,
     prefecture TEXT,
     search_key TEXT UNIQUE NOT NULL,
-    ai_result TEXT NOT NULL,
-    search_results TEXT,  -- Google検索結果HTML
+    ai_result TEXT,  -- 旧形式: 分析結果Markdown（移行後はNULL）
+    search_results TEXT,  -- 旧形式: Google検索結果HTML（移行後はNULL）
+    ai_result_gz TEXT,  -- 分析結果Markdown（gzip + base64）
+    search_results_json JSONB,  -- Google検索結果 [{title, link, snippet}]
     created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
     updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
     access_count INTEGER DEFAULT 1
@@ -37,3 +39,18 @@ BEGIN
         ALTER TABLE school_risk_cache ADD COLUMN search_results TEXT;
     END IF;
 END $$;
+
+-- v3: 分析結果の圧縮保存・検索結果の構造化保存（既存行は scripts/compress_school_cache.py で移行）
+ALTER TABLE school_risk_cache ADD COLUMN IF NOT EXISTS ai_result_gz TEXT;
+ALTER TABLE school_risk_cache ADD COLUMN IF NOT EXISTS search_results_json JSONB;
+ALTER TABLE school_risk_cache ALTER COLUMN ai_result DROP NOT NULL;
+
+-- access_count をまとめて加算するRPC（アプリ側でヒット数を集計して一括送信）
+-- 例: SELECT increment_school_risk_access(ARRAY['key1','key2'], ARRAY[3,1]);
+CREATE OR REPLACE FUNCTION increment_school_risk_access(keys TEXT[], counts INTEGER[])
+RETURNS void AS $$
+    UPDATE school_risk_cache AS c
+    SET access_count = COALESCE(c.access_count, 0) + d.cnt
+    FROM unnest(keys, counts) AS d(search_key, cnt)
+    WHERE c.search_key = d.search_key;
+$$ LANGUAGE sql;